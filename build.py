@@ -4,6 +4,7 @@ Copyright (c) 2025 Jay Wenden
 Licensed under CC-BY-NC-SA 4.0
 """
 
+import os
 import sys
 import subprocess
 import shutil
@@ -13,5 +14,14 @@ if not shutil.which("docker"):
     print("https://www.docker.com/products/docker-desktop/")
     sys.exit(1)
 
+# BuildKit with inline cache metadata, so later builds can reuse unchanged
+# layers from the local intermap:latest
+env = {**os.environ, "DOCKER_BUILDKIT": "1"}
+
 print("Building Intermap Docker image...")
-subprocess.run(["docker", "build", "-t", "intermap:latest", "."])
+subprocess.run([
+    "docker", "build",
+    "--cache-from", "intermap:latest",
+    "--build-arg", "BUILDKIT_INLINE_CACHE=1",
+    "-t", "intermap:latest", "."
+], env=env)
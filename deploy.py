@@ -6,6 +6,8 @@ Licensed under CC-BY-NC-SA 4.0
 Intermap Docker Deployment Script
 Waits for Docker, builds image, and deploys container
 """
+import os
+import socket
 import subprocess
 import sys
 import time
@@ -15,6 +17,41 @@ def check_docker():
     """Check if Docker is available."""
     return shutil.which("docker") is not None
 
+def docker_socket_ready(path="/var/run/docker.sock"):
+    """
+    Ping the Docker daemon over its UNIX socket without spawning the docker CLI.
+    
+    Returns True/False, or None if there is no socket to check.
+    """
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(path):
+        return None
+    
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(2)
+            s.connect(path)
+            s.sendall(b"GET /_ping HTTP/1.0\r\nHost: docker\r\n\r\n")
+            status_line = s.recv(64).split(b"\r\n", 1)[0]
+            return status_line.split()[1:2] == [b"200"]
+    except OSError:
+        return False
+
+def docker_daemon_ready():
+    """Check if the Docker daemon is answering requests."""
+    ready = docker_socket_ready()
+    if ready is not None:
+        return ready
+    
+    try:
+        result = subprocess.run(
+            ["docker", "info"],
+            capture_output=True,
+            timeout=5
+        )
+        return result.returncode == 0
+    except:
+        return False
+
 def wait_for_docker():
     """Wait for Docker to be ready."""
     print("Checking for Docker...")
@@ -25,23 +62,16 @@ def wait_for_docker():
     
     print("✓ Docker found!")
     
-    # Wait for Docker daemon to be ready
-    max_attempts = 12
+    # Wait for Docker daemon to be ready, backing off from 100ms up to 2s
+    # between checks (~60s in total)
+    max_attempts = 35
     for i in range(max_attempts):
-        try:
-            result = subprocess.run(
-                ["docker", "info"],
-                capture_output=True,
-                timeout=5
-            )
-            if result.returncode == 0:
-                print("✓ Docker daemon is ready!")
-                return True
-        except:
-            pass
+        if docker_daemon_ready():
+            print("✓ Docker daemon is ready!")
+            return True
         
         print(f"⏳ Waiting for Docker daemon... ({i+1}/{max_attempts})")
-        time.sleep(5)
+        time.sleep(min(2.0, 0.1 * (2 ** i)))
     
     print("❌ Docker daemon not responding")
     return False
@@ -52,7 +82,15 @@ def build_image():
     print("Building Intermap Docker image...")
     print("="*60 + "\n")
     
-    result = subprocess.run(["docker", "build", "-t", "intermap:latest", "."])
+    # BuildKit with inline cache metadata, so unchanged layers are reused
+    env = {**os.environ, "DOCKER_BUILDKIT": "1"}
+    
+    result = subprocess.run([
+        "docker", "build",
+        "--cache-from", "intermap:latest",
+        "--build-arg", "BUILDKIT_INLINE_CACHE=1",
+        "-t", "intermap:latest", "."
+    ], env=env)
     
     if result.returncode != 0:
         print("\n❌ Build failed!")
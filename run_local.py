@@ -6,6 +6,7 @@ Licensed under CC-BY-NC-SA 4.0
 Run Intermap locally without Docker
 Quick launcher for development/testing
 """
+import hashlib
 import subprocess
 import sys
 import os
@@ -65,12 +66,36 @@ api_process = subprocess.Popen(
 
 time.sleep(2)
 
-# Check if frontend is built
+def frontend_inputs_hash() -> str:
+    """Hash the frontend's dependency lockfile and sources."""
+    h = hashlib.blake2b(digest_size=16)
+    frontend = Path("frontend")
+    inputs = [frontend / "package.json", frontend / "package-lock.json"]
+    for directory in (frontend / "src", frontend / "public"):
+        inputs.extend(sorted(p for p in directory.rglob("*") if p.is_file()))
+    for path in inputs:
+        if path.exists():
+            h.update(path.as_posix().encode())
+            h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+# Check if frontend is built and up to date (only rebuild when inputs changed)
 frontend_build = Path("frontend/build")
-if not frontend_build.exists():
+inputs_hash_file = frontend_build / ".inputs_hash"
+inputs_hash = frontend_inputs_hash()
+built_hash = inputs_hash_file.read_text().strip() if inputs_hash_file.exists() else None
+
+if built_hash != inputs_hash:
     print("\nBuilding frontend...")
-    subprocess.run(["npm", "install"], cwd="frontend", shell=True)
-    subprocess.run(["npm", "run", "build"], cwd="frontend", shell=True)
+    # npm is a .cmd shim on Windows and needs the shell there
+    use_shell = os.name == "nt"
+    install = subprocess.run(["npm", "install"], cwd="frontend", shell=use_shell)
+    build = subprocess.run(["npm", "run", "build"], cwd="frontend", shell=use_shell)
+    if install.returncode == 0 and build.returncode == 0 and frontend_build.exists():
+        inputs_hash_file.write_text(inputs_hash)
+else:
+    print("✓ Frontend build is up to date")
 
 # Start simple HTTP server for frontend
 print("\nStarting web interface...")
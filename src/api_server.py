@@ -7,28 +7,69 @@ Licensed under CC-BY-NC-SA 4.0
 API server for serving topology data to the frontend
 """
 from flask import Flask, jsonify, send_file, send_from_directory, request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from pathlib import Path
 import logging
 import json
 from datetime import datetime
+import gzip
+import multiprocessing
+import os
+import queue
+import shutil
 import socket
 import sys
 import threading
+import time
+
+try:
+    from lxml import etree as ET  # C parser, much faster on large topologies
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from src.traceroute.tracer import Traceroute
-from src.graph.gexf_generator import GEXFGenerator
-from src.utils import is_public_ip
+from src.graph.gexf_generator import NetworkGraph, GEXFGenerator
+from src.utils import is_public_ip, topology_write_lock
 
 logger = logging.getLogger(__name__)
 
 # Paths
 PROJECT_ROOT = Path(__file__).parent.parent
 OUTPUT_DIR = PROJECT_ROOT / "output"
+OUTPUT_DIR_RESOLVED = OUTPUT_DIR.resolve()
 FRONTEND_BUILD = PROJECT_ROOT / "frontend" / "build"
 NODE_INFO_FILE = OUTPUT_DIR / "node_info.json"
+LATEST_TOPOLOGY_FILE = OUTPUT_DIR / "topology_latest.gexf"
+
+# GEXF element tags (default namespace written by GEXFGenerator)
+GEXF_NS = "http://gexf.net/1.3"
+_NODE_TAG = f"{{{GEXF_NS}}}node"
+_EDGE_TAG = f"{{{GEXF_NS}}}edge"
+_ATTVALUE_TAG = f"{{{GEXF_NS}}}attvalue"
+
+if hasattr(ET, "XPath"):
+    # lxml: filter events to node/edge in C and use a precompiled XPath for
+    # the edge RTT attvalue (for="0")
+    _ITERPARSE_KWARGS = {"tag": (_NODE_TAG, _EDGE_TAG)}
+    _EDGE_RTT_VALUES = ET.XPath('g:attvalues/g:attvalue[@for="0"]/@value', namespaces={'g': GEXF_NS})
+else:
+    _ITERPARSE_KWARGS = {}
+    
+    def _EDGE_RTT_VALUES(edge):
+        return [av.get('value') for av in edge.iter(_ATTVALUE_TAG) if av.get('for') == "0"]
 
 # Initialize Flask with static folder pointing to frontend build
 app = Flask(__name__, 
@@ -36,21 +77,352 @@ app = Flask(__name__,
             static_url_path='/static')
 CORS(app)  # Enable CORS for frontend
 
+# Hand GEXF downloads to a fronting web server via X-Sendfile so it can
+# sendfile(2) them; only enable behind a proxy that honours the header and
+# sees OUTPUT_DIR at the same path, otherwise clients get empty bodies
+app.config["USE_X_SENDFILE"] = os.environ.get("INTERMAP_X_SENDFILE", "").lower() in ("1", "true", "yes")
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson for the polled JSON endpoints."""
+    
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+if orjson is not None:
+    app.json = ORJSONProvider(app)
+
 # Store node's own external IP for highlighting in visualizer
 OWN_EXTERNAL_IP = None
 
+# Hostname doesn't change while we run; node_info.json is only re-read
+# when its mtime changes
+_HOSTNAME = socket.gethostname()
+_NODE_INFO_MTIME = 0
+
+# Accumulated topology kept in memory between traces; only re-parsed from
+# disk when topology_latest.gexf changes underneath us (e.g. node.py wrote it)
+_GRAPH_CACHE = {"mtime": 0, "graph": NetworkGraph()}
+_GRAPH_LOCK = threading.RLock()
+
+# Traceroutes requested through the API are merged by a single worker thread
+TRACE_QUEUE_SIZE = 64
+_TRACE_Q = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+_TRACE_WORKER = None
+_TRACE_WORKER_LOCK = threading.Lock()
+
+# Index of topology_*.gexf files, newest first, refreshed by a background
+# scanner so requests never have to enumerate/stat the output directory
+TOPOLOGY_INDEX_INTERVAL = 2.0  # seconds between directory rescans
+TOPOLOGY_MAX_AGE = 5  # Cache-Control max-age for served topology files
+_TOPO_INDEX = {"latest": None, "files": [], "stale": True}
+_TOPO_INDEX_LOCK = threading.Lock()
+_TOPO_INDEXER = None
+
+# Serializes lazy gzip sidecar writes within this process
+_GZIP_LOCK = threading.Lock()
+
+# Response timestamps are reformatted at most every 100ms
+_NOW_CACHE = {"t": 0.0, "now": ("", 0)}
+
+def _now() -> tuple:
+    """
+    Get the current time for API responses, cached for 100ms.
+    
+    Returns:
+        Tuple of (ISO 8601 local time string, epoch milliseconds)
+    """
+    t = time.time()
+    if t - _NOW_CACHE["t"] > 0.1:
+        # Swap the tuple in one assignment so threads never see a torn pair
+        _NOW_CACHE["now"] = (datetime.fromtimestamp(t).isoformat(), int(t * 1000))
+        _NOW_CACHE["t"] = t
+    return _NOW_CACHE["now"]
+
+
 def load_node_info():
-    """Load node info from file if available."""
-    global OWN_EXTERNAL_IP
+    """Load node info from file if available and changed since last load."""
+    global OWN_EXTERNAL_IP, _NODE_INFO_MTIME
     try:
-        if NODE_INFO_FILE.exists():
-            with open(NODE_INFO_FILE, 'r') as f:
-                info = json.load(f)
-                OWN_EXTERNAL_IP = info.get('external_ip')
-                logger.info(f"Loaded node info: {OWN_EXTERNAL_IP}")
+        try:
+            mtime = NODE_INFO_FILE.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        
+        if mtime == _NODE_INFO_MTIME:
+            return
+        
+        with open(NODE_INFO_FILE, 'r') as f:
+            info = json.load(f)
+        
+        _NODE_INFO_MTIME = mtime
+        OWN_EXTERNAL_IP = info.get('external_ip')
+        logger.info(f"Loaded node info: {OWN_EXTERNAL_IP}")
     except Exception as e:
         logger.error(f"Failed to load node info: {e}")
 
+def _parse_topology(path: Path) -> NetworkGraph:
+    """
+    Stream-parse a GEXF file into a NetworkGraph.
+    
+    Elements are cleared as soon as they are consumed so the full tree
+    is never held in memory.
+    """
+    graph = NetworkGraph()
+    
+    for _, elem in ET.iterparse(str(path), events=("end",), **_ITERPARSE_KWARGS):
+        if elem.tag == _NODE_TAG:
+            node_id = elem.get('id')
+            graph.add_node(node_id, hostname=elem.get('label', node_id))
+            elem.clear()
+        elif elem.tag == _EDGE_TAG:
+            # Get RTT from edge attributes
+            rtt_ms = None
+            for value in _EDGE_RTT_VALUES(elem):
+                try:
+                    rtt_ms = float(value)
+                except (ValueError, TypeError):
+                    pass
+            
+            graph.add_edge(elem.get('source'), elem.get('target'), rtt_ms=rtt_ms)
+            elem.clear()
+    
+    return graph
+
+
+def _load_graph_if_stale() -> NetworkGraph:
+    """
+    Return the cached accumulated topology, re-parsing topology_latest.gexf
+    only if it was modified since it was last loaded.
+    
+    Must be called with _GRAPH_LOCK held.
+    """
+    try:
+        mtime = LATEST_TOPOLOGY_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        return _GRAPH_CACHE["graph"]
+    
+    if mtime != _GRAPH_CACHE["mtime"]:
+        try:
+            graph = _parse_topology(LATEST_TOPOLOGY_FILE)
+            logger.info(f"API: Loaded existing topology: {len(graph.nodes)} nodes, {len(graph.edges)} edges")
+        except Exception as e:
+            logger.warning(f"API: Could not load existing topology: {e}. Starting fresh.")
+            graph = NetworkGraph()
+        
+        _GRAPH_CACHE["graph"] = graph
+        _GRAPH_CACHE["mtime"] = mtime
+    
+    return _GRAPH_CACHE["graph"]
+
+
+def _refresh_topology_index():
+    """Rescan OUTPUT_DIR and rebuild the topology file index."""
+    files = []
+    sidecars = []
+    try:
+        with os.scandir(OUTPUT_DIR) as entries:
+            for entry in entries:
+                if not entry.name.startswith("topology_") or not entry.is_file():
+                    continue
+                if entry.name.endswith(".gexf"):
+                    # DirEntry caches stat info from the directory read
+                    files.append((Path(entry.path), entry.stat()))
+                elif entry.name.endswith(".gexf.gz"):
+                    sidecars.append((Path(entry.path), entry.stat()))
+    except FileNotFoundError:
+        pass
+    
+    # Sidecars go with their GEXF: drop them once it is deleted or rewritten
+    mtimes = {path.name: stat.st_mtime_ns for path, stat in files}
+    for gz_path, gz_stat in sidecars:
+        source_mtime = mtimes.get(gz_path.name[:-len(".gz")])
+        if source_mtime is None or source_mtime > gz_stat.st_mtime_ns:
+            try:
+                gz_path.unlink()
+            except FileNotFoundError:
+                pass
+    
+    files.sort(key=lambda f: f[1].st_mtime, reverse=True)
+    
+    with _TOPO_INDEX_LOCK:
+        _TOPO_INDEX["files"] = files
+        _TOPO_INDEX["latest"] = files[0] if files else None
+        _TOPO_INDEX["stale"] = False
+
+
+def _topology_indexer():
+    """Background thread keeping the topology index fresh."""
+    while True:
+        try:
+            _refresh_topology_index()
+        except Exception as e:
+            logger.warning(f"API: Topology index refresh failed: {e}")
+        time.sleep(TOPOLOGY_INDEX_INTERVAL)
+
+
+def invalidate_topology_index():
+    """Mark the topology index stale so the next read rescans immediately."""
+    with _TOPO_INDEX_LOCK:
+        _TOPO_INDEX["stale"] = True
+
+
+def get_topology_index() -> dict:
+    """
+    Get the current topology file index.
+    
+    Returns:
+        Dict with "latest" (path, stat) tuple or None, and "files" list of
+        (path, stat) tuples sorted newest first
+    """
+    global _TOPO_INDEXER
+    
+    if _TOPO_INDEXER is None:
+        with _TOPO_INDEX_LOCK:
+            if _TOPO_INDEXER is None:
+                _TOPO_INDEXER = threading.Thread(target=_topology_indexer, daemon=True, name="topology-indexer")
+                _TOPO_INDEXER.start()
+    
+    if _TOPO_INDEX["stale"]:
+        _refresh_topology_index()
+    
+    with _TOPO_INDEX_LOCK:
+        return {"latest": _TOPO_INDEX["latest"], "files": _TOPO_INDEX["files"]}
+
+
+def _gzip_sidecar(path: Path) -> Path:
+    """Path of the precompressed copy of a topology file."""
+    return path.with_name(f"{path.name}.gz")
+
+
+def _write_gzip_sidecar(path: Path):
+    """Write a gzip-compressed copy of path next to it for compressed serving."""
+    gz_path = _gzip_sidecar(path)
+    # Per-process temp name; gunicorn workers may compress the same file at once
+    tmp_path = gz_path.with_name(f".{gz_path.name}.{os.getpid()}.tmp")
+    with open(path, "rb") as src, gzip.open(tmp_path, "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp_path, gz_path)
+
+
+def _current_gzip_sidecar(path: Path, stat: os.stat_result) -> Path:
+    """
+    Get the gzip sidecar of path, compressing it on first use.
+    
+    A sidecar is current if it was written after the file's last
+    modification; otherwise it is rewritten.
+    
+    Args:
+        path: GEXF file
+        stat: Stat result for path
+        
+    Returns:
+        Path of the current sidecar
+    """
+    gz_path = _gzip_sidecar(path)
+    
+    def is_current() -> bool:
+        try:
+            return gz_path.stat().st_mtime_ns >= stat.st_mtime_ns
+        except FileNotFoundError:
+            return False
+    
+    if not is_current():
+        with _GZIP_LOCK:
+            # Another request may have compressed it while we waited
+            if not is_current():
+                _write_gzip_sidecar(path)
+    return gz_path
+
+
+def _replace_with_link(src: Path, dst: Path):
+    """
+    Atomically make dst a hardlink to src.
+    
+    Falls back to a plain copy on filesystems without hardlink support.
+    """
+    # Unique per writer: the node writes topology_latest.gexf through its own
+    # temp file, and a shared name would let one writer truncate the other's
+    # (hardlinked) file
+    tmp_link = dst.with_name(f".{dst.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        # rename() is a no-op between two links to the same inode
+        if dst.exists() and dst.samefile(src):
+            return
+        os.link(src, tmp_link)
+        try:
+            os.replace(tmp_link, dst)
+        except OSError:
+            os.unlink(tmp_link)
+            raise
+    except OSError as e:
+        logger.debug(f"API: Hardlink {dst.name} -> {src.name} failed ({e}), copying instead")
+        shutil.copy(src, dst)
+
+
+def _link_latest_topology(output_file: Path):
+    """
+    Point topology_latest.gexf at output_file.
+    
+    Uses hardlinks so the merged topology is never rewritten a second time.
+    """
+    _replace_with_link(output_file, LATEST_TOPOLOGY_FILE)
+    
+    # The old sidecar compresses the previous topology
+    try:
+        _gzip_sidecar(LATEST_TOPOLOGY_FILE).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _send_topology(path: Path, stat: os.stat_result = None):
+    """
+    Send a GEXF file, gzip-compressed if the client accepts it, with an
+    ETag so polling clients get cheap 304 responses.
+    
+    The compressed copy is written to a sidecar file by the first gzip
+    request and reused until the GEXF changes.
+    
+    Args:
+        path: GEXF file to send
+        stat: Optional cached stat result for path
+    """
+    if stat is None:
+        stat = path.stat()
+    
+    send_path = path
+    etag = f"{stat.st_mtime_ns}-{stat.st_size}"
+    
+    if request.accept_encodings["gzip"]:
+        try:
+            send_path = _current_gzip_sidecar(path, stat)
+            etag += "-gz"
+        except OSError as e:
+            logger.debug(f"API: Could not compress {path.name} ({e}), sending it uncompressed")
+    
+    response = send_file(
+        send_path,
+        mimetype='application/xml',
+        as_attachment=False,
+        download_name=path.name,
+        conditional=True,
+        etag=etag,
+        last_modified=stat.st_mtime,
+        max_age=TOPOLOGY_MAX_AGE
+    )
+    
+    if send_path is not path:
+        response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    
+    return response
+
+
 def set_own_ip(ip: str):
     """Set the node's own external IP for visualization highlighting."""
     global OWN_EXTERNAL_IP
@@ -65,10 +437,13 @@ def get_node_info():
         # Reload from file in case it changed (mobile device)
         load_node_info()
         
+        now_iso, now_ms = _now()
+        
         return jsonify({
             "external_ip": OWN_EXTERNAL_IP,
-            "hostname": socket.gethostname(),
-            "timestamp": datetime.now().isoformat()
+            "hostname": _HOSTNAME,
+            "timestamp": now_iso,
+            "timestamp_ms": now_ms
         })
     except Exception as e:
         logger.error(f"Error getting node info: {e}")
@@ -80,19 +455,14 @@ def get_latest_topology():
     """Get the most recent GEXF topology file."""
     try:
         # Find most recent GEXF file
-        gexf_files = sorted(OUTPUT_DIR.glob("topology_*.gexf"), key=lambda p: p.stat().st_mtime, reverse=True)
+        latest = get_topology_index()["latest"]
         
-        if not gexf_files:
+        if latest is None:
             return jsonify({"error": "No topology data available yet"}), 404
         
-        latest_file = gexf_files[0]
+        latest_file, stat = latest
         
-        return send_file(
-            latest_file,
-            mimetype='application/xml',
-            as_attachment=False,
-            download_name=latest_file.name
-        )
+        return _send_topology(latest_file, stat)
         
     except Exception as e:
         logger.error(f"Error serving topology: {e}")
@@ -103,11 +473,8 @@ def get_latest_topology():
 def list_topologies():
     """List all available topology files."""
     try:
-        gexf_files = sorted(OUTPUT_DIR.glob("topology_*.gexf"), key=lambda p: p.stat().st_mtime, reverse=True)
-        
         files = []
-        for f in gexf_files:
-            stat = f.stat()
+        for f, stat in get_topology_index()["files"]:
             files.append({
                 "filename": f.name,
                 "size": stat.st_size,
@@ -126,21 +493,13 @@ def list_topologies():
 def get_topology_file(filename):
     """Get a specific topology file by name."""
     try:
-        file_path = OUTPUT_DIR / filename
-        
-        if not file_path.exists() or not file_path.is_file():
+        # Security: reject anything that resolves outside OUTPUT_DIR before
+        # touching the file itself
+        file_path = (OUTPUT_DIR / filename).resolve()
+        if not file_path.is_relative_to(OUTPUT_DIR_RESOLVED) or not file_path.is_file():
             return jsonify({"error": "File not found"}), 404
         
-        # Security: ensure filename doesn't contain path traversal
-        if ".." in filename or "/" in filename or "\\" in filename:
-            return jsonify({"error": "Invalid filename"}), 400
-        
-        return send_file(
-            file_path,
-            mimetype='application/xml',
-            as_attachment=False,
-            download_name=filename
-        )
+        return _send_topology(file_path)
         
     except Exception as e:
         logger.error(f"Error serving file: {e}")
@@ -151,12 +510,13 @@ def get_topology_file(filename):
 def get_stats():
     """Get network statistics."""
     try:
-        # This could be enhanced to parse GEXF and return actual stats
-        gexf_files = list(OUTPUT_DIR.glob("topology_*.gexf"))
+        now_iso, now_ms = _now()
         
+        # Count straight from the cached index; no directory listing per poll
         return jsonify({
-            "topology_files": len(gexf_files),
-            "last_update": datetime.now().isoformat(),
+            "topology_files": len(get_topology_index()["files"]),
+            "last_update": now_iso,
+            "timestamp_ms": now_ms,
             "status": "active"
         })
         
@@ -165,6 +525,120 @@ def get_stats():
         return jsonify({"error": str(e)}), 500
 
 
+def _hop_rtt_deltas(hops) -> list:
+    """
+    RTT difference between each pair of consecutive hops.
+    
+    Args:
+        hops: List of Hop objects in path order
+        
+    Returns:
+        List of len(hops) - 1 absolute RTT deltas in milliseconds
+    """
+    if np is None:
+        return [abs(b.rtt_ms - a.rtt_ms) for a, b in zip(hops, hops[1:])]
+    
+    rtts = np.fromiter((hop.rtt_ms for hop in hops), dtype=np.float64, count=len(hops))
+    return np.abs(np.diff(rtts)).tolist()
+
+
+def _run_trace(target: str):
+    """
+    Traceroute to target and merge the hops into the accumulated topology.
+    
+    Only ever called from the single trace worker thread, so merges and
+    topology writes never race each other.
+    """
+    try:
+        logger.info(f"API: Starting traceroute to {target}")
+        tracer = Traceroute(max_hops=15, timeout=3, filter_private=False, verify_reachable=True)
+        hops = tracer.trace(target, filter_private_override=False)
+        
+        if hops:
+            logger.info(f"API: Traceroute to {target} completed with {len(hops)} hops")
+            
+            # Each gunicorn worker has its own trace queue and graph cache; the
+            # file lock keeps their merges (and the node's own topology
+            # writes) from interleaving. The cache notices the other writers
+            # through the topology_latest.gexf mtime
+            with _GRAPH_LOCK, topology_write_lock(OUTPUT_DIR):
+                # Merge into the cached accumulated topology
+                graph = _load_graph_if_stale()
+                
+                # Add NEW traceroute hops to the existing graph
+                for hop in hops:
+                    graph.add_node(hop.ip_address, hostname=hop.hostname)
+                
+                for i, rtt_delta in enumerate(_hop_rtt_deltas(hops)):
+                    graph.add_edge(
+                        hops[i].ip_address,
+                        hops[i+1].ip_address,
+                        rtt_ms=rtt_delta
+                    )
+                
+                logger.info(f"API: Merged topology now has {len(graph.nodes)} nodes, {len(graph.edges)} edges")
+                
+                # Get external IP for adding as source node
+                from src.nat_detection import detect_nat
+                try:
+                    _, local_ip, external_ip = detect_nat()
+                    if external_ip:
+                        # Add YOUR NODE as the source of this traceroute
+                        graph.add_node(external_ip, f"{external_ip} (YOU)")
+                        
+                        # Connect your node to first hop
+                        if len(hops) > 0:
+                            first_hop = hops[0]
+                            graph.add_edge(
+                                external_ip,
+                                first_hop.ip_address,
+                                rtt_ms=first_hop.rtt_ms
+                            )
+                            logger.info(f"API: Added source node {external_ip} connected to first hop")
+                except Exception as e:
+                    logger.warning(f"API: Could not add source node: {e}")
+                
+                # Generate timestamped backup
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                output_file = OUTPUT_DIR / f"topology_{timestamp}.gexf"
+                
+                generator = GEXFGenerator(graph)
+                generator.generate(str(output_file), title="Accumulated Internet Topology")
+                
+                # Update topology_latest.gexf with merged data
+                _link_latest_topology(output_file)
+                
+                # Our own write - the cached graph is already up to date
+                _GRAPH_CACHE["mtime"] = LATEST_TOPOLOGY_FILE.stat().st_mtime_ns
+                invalidate_topology_index()
+            
+            logger.info(f"API: Updated topology file generated: {output_file}")
+        else:
+            logger.warning(f"API: Traceroute to {target} returned no hops")
+    
+    except Exception as e:
+        logger.error(f"API: Traceroute thread error: {e}", exc_info=True)
+
+
+def _trace_worker():
+    """Drain the trace queue one target at a time."""
+    while True:
+        target = _TRACE_Q.get()
+        try:
+            _run_trace(target)
+        finally:
+            _TRACE_Q.task_done()
+
+
+def _ensure_trace_worker():
+    """Start the trace worker thread on first use."""
+    global _TRACE_WORKER
+    with _TRACE_WORKER_LOCK:
+        if _TRACE_WORKER is None or not _TRACE_WORKER.is_alive():
+            _TRACE_WORKER = threading.Thread(target=_trace_worker, daemon=True, name="trace-worker")
+            _TRACE_WORKER.start()
+
+
 @app.route('/api/trace', methods=['POST'])
 def trigger_traceroute():
     """
@@ -194,117 +668,17 @@ def trigger_traceroute():
             if not is_public_ip(target):
                 return jsonify({"error": f"Target {target} is not a public IP address"}), 400
             
-            # Run traceroute in background thread
-            def run_trace():
-                try:
-                    logger.info(f"API: Starting traceroute to {target}")
-                    tracer = Traceroute(max_hops=15, timeout=3, filter_private=False, verify_reachable=True)
-                    hops = tracer.trace(target, filter_private_override=False)
-                    
-                    if hops:
-                        logger.info(f"API: Traceroute to {target} completed with {len(hops)} hops")
-                        
-                        # Import NetworkGraph here to avoid circular imports
-                        from src.graph.gexf_generator import NetworkGraph, GEXFGenerator
-                        
-                        # Load existing topology and merge
-                        latest_file = OUTPUT_DIR / "topology_latest.gexf"
-                        graph = NetworkGraph()
-                        
-                        if latest_file.exists():
-                            try:
-                                # Parse existing GEXF to preserve accumulated topology
-                                import xml.etree.ElementTree as ET
-                                tree = ET.parse(latest_file)
-                                root = tree.getroot()
-                                
-                                # Define namespace
-                                ns = {'gexf': 'http://gexf.net/1.3'}
-                                
-                                # Load existing nodes
-                                for node in root.findall('.//gexf:node', ns):
-                                    node_id = node.get('id')
-                                    label = node.get('label', node_id)
-                                    graph.add_node(node_id, hostname=label)
-                                
-                                # Load existing edges
-                                for edge in root.findall('.//gexf:edge', ns):
-                                    source = edge.get('source')
-                                    target_node = edge.get('target')
-                                    
-                                    # Get RTT from edge attributes
-                                    rtt_ms = None
-                                    for attvalue in edge.findall('.//gexf:attvalue[@for="0"]', ns):
-                                        try:
-                                            rtt_ms = float(attvalue.get('value'))
-                                        except (ValueError, TypeError):
-                                            pass
-                                    
-                                    graph.add_edge(source, target_node, rtt_ms=rtt_ms)
-                                
-                                logger.info(f"API: Loaded existing topology: {len(graph.nodes)} nodes, {len(graph.edges)} edges")
-                            except Exception as e:
-                                logger.warning(f"API: Could not load existing topology: {e}. Starting fresh.")
-                        
-                        # Add NEW traceroute hops to the existing graph
-                        for hop in hops:
-                            graph.add_node(hop.ip_address, hostname=hop.hostname)
-                        
-                        for i in range(len(hops) - 1):
-                            graph.add_edge(
-                                hops[i].ip_address,
-                                hops[i+1].ip_address,
-                                rtt_ms=abs(hops[i+1].rtt_ms - hops[i].rtt_ms)
-                            )
-                        
-                        logger.info(f"API: Merged topology now has {len(graph.nodes)} nodes, {len(graph.edges)} edges")
-                        
-                        # Get external IP for adding as source node
-                        from src.nat_detection import detect_nat
-                        try:
-                            _, local_ip, external_ip = detect_nat()
-                            if external_ip:
-                                # Add YOUR NODE as the source of this traceroute
-                                graph.add_node(external_ip, f"{external_ip} (YOU)")
-                                
-                                # Connect your node to first hop
-                                if len(hops) > 0:
-                                    first_hop = hops[0]
-                                    graph.add_edge(
-                                        external_ip,
-                                        first_hop.ip_address,
-                                        rtt_ms=first_hop.rtt_ms
-                                    )
-                                    logger.info(f"API: Added source node {external_ip} connected to first hop")
-                        except Exception as e:
-                            logger.warning(f"API: Could not add source node: {e}")
-                        
-                        # Generate timestamped backup
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        output_file = OUTPUT_DIR / f"topology_{timestamp}.gexf"
-                        
-                        generator = GEXFGenerator(graph)
-                        generator.generate(str(output_file), title="Accumulated Internet Topology")
-                        
-                        # Update topology_latest.gexf with merged data
-                        import shutil
-                        shutil.copy(output_file, latest_file)
-                        
-                        logger.info(f"API: Updated topology file generated: {output_file}")
-                    else:
-                        logger.warning(f"API: Traceroute to {target} returned no hops")
-                        
-                except Exception as e:
-                    logger.error(f"API: Traceroute thread error: {e}", exc_info=True)
-            
-            # Start background thread
-            thread = threading.Thread(target=run_trace, daemon=True)
-            thread.start()
+            # Queue for the single background trace worker
+            _ensure_trace_worker()
+            try:
+                _TRACE_Q.put_nowait(target)
+            except queue.Full:
+                return jsonify({"error": "Too many traceroutes queued, try again later"}), 429
             
             return jsonify({
-                "status": "started",
+                "status": "queued",
                 "target": target,
-                "message": f"Traceroute to {target} started in background"
+                "message": f"Traceroute to {target} queued ({_TRACE_Q.qsize()} pending)"
             }), 202
         
     except Exception as e:
@@ -343,19 +717,61 @@ def serve_frontend(path):
 
 
 def run_server(host='0.0.0.0', port=5000):
-    """Run the API server."""
+    """
+    Run the API server.
+    
+    Uses gunicorn (one gthread worker per core) where available, waitress
+    on Windows, and only falls back to Flask's development server if
+    neither is installed.
+    """
     logger.info(f"Starting API server on {host}:{port}")
     try:
-        logger.info(f"About to call app.run()...")
+        try:
+            from gunicorn.app.base import BaseApplication
+        except ImportError:
+            BaseApplication = None
+        
+        if BaseApplication is not None:
+            class _GunicornApplication(BaseApplication):
+                def __init__(self, options):
+                    self.options = options
+                    super().__init__()
+                
+                def load_config(self):
+                    for key, value in self.options.items():
+                        self.cfg.set(key, value)
+                
+                def load(self):
+                    return app
+            
+            workers = int(os.getenv('API_WORKERS', multiprocessing.cpu_count()))
+            logger.info(f"Serving with gunicorn ({workers} workers)")
+            _GunicornApplication({
+                "bind": f"{host}:{port}",
+                "workers": workers,
+                "worker_class": "gthread",
+                "threads": 4,
+            }).run()
+            return
+        
+        try:
+            import waitress
+        except ImportError:
+            waitress = None
+        
+        if waitress is not None:
+            logger.info("Serving with waitress")
+            waitress.serve(app, host=host, port=port, threads=16)
+            return
+        
+        logger.warning("gunicorn/waitress not installed - using Flask development server")
         app.run(host=host, port=port, debug=False, threaded=True, use_reloader=False)
-        logger.info(f"app.run() returned (this should not happen!)")
     except Exception as e:
-        logger.error(f"Exception during app.run(): {e}", exc_info=True)
+        logger.error(f"Exception while running API server: {e}", exc_info=True)
         raise
 
 
 if __name__ == "__main__":
-    import os
     logging.basicConfig(
         level=logging.INFO,
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -6,16 +6,162 @@ Licensed under CC-BY-NC-SA 4.0
 """
 Bandwidth testing module - iperf3 and speedtest integration
 """
+import asyncio
+import errno
+import ipaddress
 import logging
+import os
+import selectors
+import shutil
 import subprocess
 import json
 import socket
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Optional, List, Tuple
 from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+
+try:
+    from orjson import loads as json_loads  # C parser for iperf3/speedtest reports
+except ImportError:
+    json_loads = json.loads
+
+try:
+    import ijson  # incremental parser; lets us skip the per-interval samples
+except ImportError:
+    ijson = None
+
+try:
+    import speedtest as speedtest_lib  # speedtest-cli's module, used in-process
+except ImportError:
+    speedtest_lib = None
 
 logger = logging.getLogger(__name__)
 
+# Max sockets open at once while probing, well under select()'s FD_SETSIZE
+PROBE_BATCH_SIZE = 256
+
+# Pause between tests whose targets may share a bottleneck (same /16, or
+# a hostname we can't place); tests to unrelated networks run back to back
+INTER_TEST_PAUSE = 2.0
+
+# Command-line strings for the usual iperf3 ports
+_PORT_STR = {port: str(port) for port in (5002, 5200, 5201)}
+
+
+def _connect_times(addrs: List[Tuple[str, int]], timeout: float) -> Dict[Tuple[str, int], Optional[float]]:
+    """
+    Open TCP connections to all addresses at once and time the handshakes.
+    
+    Every connect() is started non-blocking and the whole batch is waited
+    on with one selector, so it takes at most ~timeout in total.
+    
+    Args:
+        addrs: List of (host, port) tuples
+        timeout: Seconds to wait for the slowest connection
+        
+    Returns:
+        Dict mapping each (host, port) to its connect time in seconds, or
+        None if the connection failed or timed out
+    """
+    results = dict.fromkeys(addrs)
+    sel = selectors.DefaultSelector()
+    
+    try:
+        for host, port in addrs:
+            try:
+                family, sock_type, proto, _, addr = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0]
+                sock = socket.socket(family, sock_type, proto)
+            except OSError as e:
+                logger.debug("Failed to probe %s:%s: %s", host, port, e)
+                continue
+            
+            sock.setblocking(False)
+            started = time.perf_counter()
+            err = sock.connect_ex(addr)
+            
+            if err in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+                sel.register(sock, selectors.EVENT_WRITE, ((host, port), started))
+                continue
+            
+            if err == 0:
+                results[(host, port)] = time.perf_counter() - started
+            sock.close()
+        
+        deadline = time.monotonic() + timeout
+        while sel.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            
+            for key, _ in sel.select(remaining):
+                sock = key.fileobj
+                addr, started = key.data
+                # Writable means the handshake finished; SO_ERROR says how
+                if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                    results[addr] = time.perf_counter() - started
+                sel.unregister(sock)
+                sock.close()
+    finally:
+        # Anything still registered timed out
+        for key in list(sel.get_map().values()):
+            key.fileobj.close()
+        sel.close()
+    
+    return results
+
+
+def _get(data: dict, *keys, default=0):
+    """Look up a nested key path in parsed JSON, returning default if any level is missing."""
+    for key in keys:
+        data = data.get(key) if isinstance(data, dict) else None
+        if data is None:
+            return default
+    return data
+
+
+@lru_cache(maxsize=4096)
+def _network_key(target: str):
+    """The /16 (IPv4) or /48 (IPv6) a target is in, or None for hostnames."""
+    try:
+        ip = ipaddress.ip_address(target)
+    except ValueError:
+        return None
+    return ipaddress.ip_network(f"{ip}/{16 if ip.version == 4 else 48}", strict=False)
+
+
+def _pause_between(previous: List[str], upcoming: List[str]) -> float:
+    """
+    How long to wait after testing previous before testing upcoming.
+    
+    Only pauses if the two groups might share a path bottleneck.
+    """
+    prev_keys = {_network_key(t) for t in previous}
+    next_keys = {_network_key(t) for t in upcoming}
+    if None in prev_keys or None in next_keys or prev_keys & next_keys:
+        return INTER_TEST_PAUSE
+    return 0.0
+
+
+@lru_cache(maxsize=None)
+def _spawn_kwargs() -> dict:
+    """
+    Extra subprocess arguments for launching test tools.
+    
+    Python's own fds are non-inheritable already, so on POSIX close_fds can
+    be turned off; together with an absolute executable path that lets
+    subprocess use posix_spawn (vfork) instead of fork + fd-closing loop.
+    """
+    if os.name != "posix":
+        logger.debug("Launching test tools with the default subprocess path")
+        return {}
+    
+    logger.debug("Launching test tools with close_fds=False (posix_spawn when possible)")
+    return {"close_fds": False}
+
 
 @dataclass
 class BandwidthResult:
@@ -30,6 +176,57 @@ class BandwidthResult:
     peak: bool = False  # True if this is the peak result for this target
 
 
+def _peak_key(target: str):
+    """Key IPv4 targets by their 32-bit address; anything else by name."""
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, target), "big")
+    except OSError:
+        return target
+
+
+class _PeakTable:
+    """
+    Peak BandwidthResult per target, in first-tested order. IPv4 targets
+    are keyed by their integer address (see _peak_key).
+    """
+    
+    def __init__(self):
+        self.results: Dict = {}  # _peak_key(target) -> peak result
+    
+    def __len__(self) -> int:
+        return len(self.results)
+    
+    def update(self, target: str, result: BandwidthResult) -> Tuple[bool, Optional[float]]:
+        """
+        Store result as the peak for target if it beats the current peak.
+        
+        The previous peak, if replaced, has its peak flag cleared.
+        
+        Returns:
+            Tuple of (True if result is the new peak, previous peak download
+            in Mbps or None if target had no peak yet)
+        """
+        key = _peak_key(target)
+        prev_peak = self.results.get(key)
+        
+        if prev_peak is not None:
+            if result.download_mbps + result.upload_mbps <= prev_peak.download_mbps + prev_peak.upload_mbps:
+                return False, prev_peak.download_mbps
+            prev_peak.peak = False
+        
+        result.peak = True
+        self.results[key] = result
+        return True, None if prev_peak is None else prev_peak.download_mbps
+    
+    def get(self, target: str) -> Optional[BandwidthResult]:
+        """Get the peak result for target, if there is one."""
+        return self.results.get(_peak_key(target))
+    
+    def all(self) -> List[BandwidthResult]:
+        """Get every peak result, in first-tested order."""
+        return list(self.results.values())
+
+
 class IPerf3Client:
     """
     Client for running iperf3 bandwidth tests.
@@ -37,19 +234,39 @@ class IPerf3Client:
     Tests bandwidth between nodes or to public iperf3 servers.
     """
     
-    def __init__(self, duration: int = 10, parallel: int = 1):
+    # Server availability changes slowly, so probe results are reused for
+    # _probe_ttl seconds; (host, port) -> (reachable, expiry)
+    _probe_cache: Dict[Tuple[str, int], Tuple[bool, float]] = {}
+    _probe_cache_lock = threading.Lock()
+    _probe_ttl = 300.0
+    
+    def __init__(self, duration: int = 10, parallel: int = 1, zero_copy: bool = True, window: Optional[str] = None):
         """
         Initialize iperf3 client.
         
         Args:
             duration: Test duration in seconds
             parallel: Number of parallel streams
+            zero_copy: Send with sendfile() (iperf3 -Z) where supported
+            window: TCP window / socket buffer size (iperf3 -w, e.g. "4M")
         """
         self.duration = duration
         self.parallel = parallel
+        # iperf3's sendfile() path isn't available in Windows builds
+        self.zero_copy = zero_copy and os.name == "posix"
+        self.window = window
+        
+        # Per-client part of the iperf3 command line, built once
+        base_cmd = [shutil.which("iperf3") or "iperf3", "-t", str(duration), "-P", str(parallel), "-J"]
+        if self.zero_copy:
+            base_cmd.append("-Z")
+        if window:
+            base_cmd.extend(["-w", window])
+        self._base_cmd = tuple(base_cmd)
+        self._spawn_kwargs = _spawn_kwargs()
     
-    @staticmethod
-    def probe_server(host: str, port: int = 5201, timeout: int = 3) -> bool:
+    @classmethod
+    def probe_server(cls, host: str, port: int = 5201, timeout: int = 3) -> bool:
         """
         Probe if a host has an iperf3 server running.
         
@@ -61,21 +278,95 @@ class IPerf3Client:
         Returns:
             True if iperf3 server is reachable, False otherwise
         """
-        try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(timeout)
-            result = sock.connect_ex((host, port))
-            sock.close()
+        return cls.probe_servers([host], port, timeout)[host]
+    
+    @classmethod
+    def probe_servers(cls, hosts: List[str], port: int = 5201, timeout: int = 3) -> Dict[str, bool]:
+        """
+        Probe many hosts for iperf3 servers at once.
+        
+        Starts a non-blocking connect() to every host and waits for all of
+        them on one selector, so the whole batch takes at most ~timeout.
+        Results are cached for _probe_ttl seconds per (host, port).
+        
+        Args:
+            hosts: Target IPs or hostnames
+            port: iperf3 port (default: 5201)
+            timeout: Connection timeout in seconds
             
-            if result == 0:
-                logger.debug(f"iperf3 server detected at {host}:{port}")
-                return True
-            else:
-                logger.debug(f"No iperf3 server at {host}:{port}")
-                return False
-        except Exception as e:
-            logger.debug(f"Failed to probe {host}:{port}: {e}")
-            return False
+        Returns:
+            Dict mapping each host to True if its iperf3 server is reachable
+        """
+        results = {}
+        pending = []
+        now = time.monotonic()
+        
+        with cls._probe_cache_lock:
+            for host in hosts:
+                cached = cls._probe_cache.get((host, port))
+                if cached is not None and now < cached[1]:
+                    results[host] = cached[0]
+                else:
+                    pending.append(host)
+        
+        for i in range(0, len(pending), PROBE_BATCH_SIZE):
+            results.update(cls._probe_batch(pending[i:i + PROBE_BATCH_SIZE], port, timeout))
+        
+        expiry = time.monotonic() + cls._probe_ttl
+        with cls._probe_cache_lock:
+            for host in pending:
+                cls._probe_cache[(host, port)] = (results[host], expiry)
+        
+        return results
+    
+    @staticmethod
+    def _probe_batch(hosts: List[str], port: int, timeout: float) -> Dict[str, bool]:
+        """Connect to all hosts without blocking and collect which ones accepted."""
+        times = _connect_times([(host, port) for host in hosts], timeout)
+        results = {host: times[(host, port)] is not None for host in hosts}
+        
+        # Skip the per-host loop entirely unless debug logging is on
+        if logger.isEnabledFor(logging.DEBUG):
+            for host, reachable in results.items():
+                if reachable:
+                    logger.debug("iperf3 server detected at %s:%s", host, port)
+                else:
+                    logger.debug("No iperf3 server at %s:%s", host, port)
+        
+        return results
+    
+    @classmethod
+    def split_by_probe_cache(cls, hosts: List[str], port: int = 5201) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Sort hosts by what the probe cache currently knows about them.
+        
+        Args:
+            hosts: Target IPs or hostnames
+            port: iperf3 port
+            
+        Returns:
+            Tuple of (cached reachable, cached unreachable, not cached)
+        """
+        ok, bad, unknown = [], [], []
+        now = time.monotonic()
+        
+        with cls._probe_cache_lock:
+            for host in hosts:
+                cached = cls._probe_cache.get((host, port))
+                if cached is None or now >= cached[1]:
+                    unknown.append(host)
+                elif cached[0]:
+                    ok.append(host)
+                else:
+                    bad.append(host)
+        
+        return ok, bad, unknown
+    
+    @classmethod
+    def clear_probe_cache(cls):
+        """Forget all cached probe results."""
+        with cls._probe_cache_lock:
+            cls._probe_cache.clear()
     
     def test_bandwidth(self, server: str, port: int = 5201, reverse: bool = False) -> Optional[BandwidthResult]:
         """
@@ -89,66 +380,244 @@ class IPerf3Client:
         Returns:
             BandwidthResult with test results, or None if test fails
         """
-        logger.info(f"Starting iperf3 test to {server}:{port} (reverse={reverse})")
+        logger.info("Starting iperf3 test to %s:%s (reverse=%s)", server, port, reverse)
         
         try:
-            # Run iperf3 client with JSON output
-            cmd = [
-                "iperf3",
-                "-c", server,
-                "-p", str(port),
-                "-t", str(self.duration),
-                "-P", str(self.parallel),
-                "-J"  # JSON output
-            ]
-            
-            # Add reverse flag if testing download
-            if reverse:
-                cmd.append("-R")
+            if ijson is not None:
+                return self._test_bandwidth_streaming(server, port, reverse)
             
             result = subprocess.run(
-                cmd,
+                self._build_command(server, port, reverse),
                 capture_output=True,
-                text=True,
-                timeout=self.duration + 10
+                timeout=self.duration + 10,
+                **self._spawn_kwargs
             )
             
             if result.returncode != 0:
-                logger.error(f"iperf3 failed: {result.stderr}")
+                logger.error("iperf3 failed: %s", result.stderr.decode(errors='replace'))
                 return None
             
-            # Parse JSON output
-            data = json.loads(result.stdout)
-            
-            # Extract bandwidth data
-            download_bps = data.get("end", {}).get("sum_received", {}).get("bits_per_second", 0)
-            upload_bps = data.get("end", {}).get("sum_sent", {}).get("bits_per_second", 0)
-            
-            # Convert to Mbps
-            download_mbps = download_bps / 1_000_000
-            upload_mbps = upload_bps / 1_000_000
-            
-            logger.info(f"iperf3 results: ↓ {download_mbps:.2f} Mbps, ↑ {upload_mbps:.2f} Mbps")
-            
-            return BandwidthResult(
-                target=server,
-                download_mbps=download_mbps,
-                upload_mbps=upload_mbps,
-                test_type="iperf3"
-            )
+            return self._parse_report(server, result.stdout)
             
         except FileNotFoundError:
             logger.error("iperf3 not found. Install with: apt install iperf3 (Linux) or choco install iperf3 (Windows)")
             return None
         except subprocess.TimeoutExpired:
-            logger.error(f"iperf3 test timed out after {self.duration + 10}s")
+            logger.error("iperf3 test timed out after %ss", self.duration + 10)
             return None
         except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse iperf3 output: {e}")
+            logger.error("Failed to parse iperf3 output: %s", e)
             return None
         except Exception as e:
-            logger.error(f"iperf3 test failed: {e}")
+            logger.error("iperf3 test failed: %s", e)
+            return None
+
+
+    def _build_command(self, server: str, port: int, reverse: bool = False, cport: Optional[int] = None) -> Tuple[str, ...]:
+        """Build the iperf3 client command line (JSON output)."""
+        cmd = (*self._base_cmd, "-c", server, "-p", _PORT_STR.get(port) or str(port))
+        
+        # Add reverse flag if testing download
+        if reverse:
+            cmd += ("-R",)
+        
+        # Fixed client port, so concurrent tests don't share ephemeral ports
+        if cport is not None:
+            cmd += ("--cport", str(cport))
+        
+        return cmd
+    
+    async def test_bandwidth_async(self, server: str, port: int = 5201, reverse: bool = False) -> Optional[BandwidthResult]:
+        """
+        Run iperf3 bandwidth test to a server without blocking the event loop.
+        
+        Args:
+            server: Target server IP or hostname
+            port: iperf3 server port (default: 5201)
+            reverse: If True, test download (server sends to client)
+            
+        Returns:
+            BandwidthResult with test results, or None if test fails
+        """
+        logger.info("Starting iperf3 test to %s:%s (reverse=%s)", server, port, reverse)
+        
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *self._build_command(server, port, reverse),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                **self._spawn_kwargs
+            )
+        except FileNotFoundError:
+            logger.error("iperf3 not found. Install with: apt install iperf3 (Linux) or choco install iperf3 (Windows)")
+            return None
+        
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=self.duration + 10)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            logger.error("iperf3 test timed out after %ss", self.duration + 10)
+            return None
+        
+        if proc.returncode != 0:
+            logger.error("iperf3 failed: %s", stderr.decode(errors='replace'))
             return None
+        
+        try:
+            return self._parse_report(server, stdout)
+        except ValueError as e:
+            logger.error("Failed to parse iperf3 output: %s", e)
+            return None
+    
+    def _test_bandwidth_streaming(self, server: str, port: int, reverse: bool) -> Optional[BandwidthResult]:
+        """
+        Run the iperf3 binary and pull the summary out of its report with
+        ijson as it is read, without decoding the per-interval samples.
+        """
+        proc = subprocess.Popen(
+            self._build_command(server, port, reverse),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            **self._spawn_kwargs
+        )
+        
+        # ijson reads block, so a timer enforces the test timeout
+        timed_out = threading.Event()
+        def kill():
+            timed_out.set()
+            proc.kill()
+        watchdog = threading.Timer(self.duration + 10, kill)
+        watchdog.start()
+        
+        end = {}
+        parse_error = None
+        try:
+            for key, value in ijson.kvitems(proc.stdout, "end", use_float=True):
+                end[key] = value
+                if "sum_sent" in end and "sum_received" in end:
+                    break
+            # "end" closes the report; drain the tail so iperf3 exits cleanly
+            proc.stdout.read()
+        except ijson.JSONError as e:
+            parse_error = e
+        finally:
+            watchdog.cancel()
+            proc.stdout.close()
+            stderr = proc.stderr.read()
+            proc.stderr.close()
+            proc.wait()
+        
+        if timed_out.is_set():
+            logger.error("iperf3 test timed out after %ss", self.duration + 10)
+            return None
+        
+        if proc.returncode != 0:
+            logger.error("iperf3 failed: %s", stderr.decode(errors='replace'))
+            return None
+        
+        if parse_error is not None:
+            logger.error("Failed to parse iperf3 output: %s", parse_error)
+            return None
+        
+        return self._result_from_summary(server, end)
+    
+    @classmethod
+    def _parse_report(cls, server: str, stdout: bytes) -> BandwidthResult:
+        """Build a BandwidthResult from an iperf3 -J report."""
+        # Parse JSON output straight from the raw stdout bytes
+        data = json_loads(stdout)
+        return cls._result_from_summary(server, _get(data, "end", default={}))
+    
+    @staticmethod
+    def _result_from_summary(server: str, end: dict) -> BandwidthResult:
+        """Build a BandwidthResult from the "end" section of an iperf3 report."""
+        # Extract bandwidth data
+        download_bps = _get(end, "sum_received", "bits_per_second")
+        upload_bps = _get(end, "sum_sent", "bits_per_second")
+        
+        # Convert to Mbps
+        download_mbps = download_bps / 1_000_000
+        upload_mbps = upload_bps / 1_000_000
+        
+        logger.info("iperf3 results: ↓ %.2f Mbps, ↑ %.2f Mbps", download_mbps, upload_mbps)
+        
+        return BandwidthResult(
+            target=server,
+            download_mbps=download_mbps,
+            upload_mbps=upload_mbps,
+            test_type="iperf3"
+        )
+    
+    def test_many(self, servers: List[Tuple[str, int]], reverse: bool = False,
+                  cport_base: Optional[int] = None, pin_cpus: bool = False) -> List[Optional[BandwidthResult]]:
+        """
+        Run iperf3 tests to several servers at the same time.
+        
+        Each test is its own iperf3 process, so a sweep isn't limited to the
+        one core a single iperf3 process can use.
+        
+        Args:
+            servers: List of (host, port) tuples to test
+            reverse: If True, test download (server sends to client)
+            cport_base: If set, test i binds client port cport_base + i
+            pin_cpus: Pin each iperf3 process to its own core with taskset
+            
+        Returns:
+            List of BandwidthResult (or None for failed tests) in server order
+        """
+        taskset = shutil.which("taskset") if pin_cpus else None
+        cpu_count = os.cpu_count() or 1
+        procs = []
+        
+        for i, (server, port) in enumerate(servers):
+            logger.info("Starting iperf3 test to %s:%s (reverse=%s)", server, port, reverse)
+            cmd = self._build_command(server, port, reverse, None if cport_base is None else cport_base + i)
+            if taskset:
+                cmd = (taskset, "-c", str(i % cpu_count)) + cmd
+            
+            try:
+                procs.append(subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **self._spawn_kwargs))
+            except FileNotFoundError:
+                logger.error("iperf3 not found. Install with: apt install iperf3 (Linux) or choco install iperf3 (Windows)")
+                procs.append(None)
+        
+        # All tests run for the same duration, so one shared deadline covers them
+        deadline = time.monotonic() + self.duration + 10
+        results = []
+        
+        for (server, port), proc in zip(servers, procs):
+            if proc is None:
+                results.append(None)
+                continue
+            
+            try:
+                stdout, stderr = proc.communicate(timeout=max(0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                logger.error("iperf3 test to %s:%s timed out after %ss", server, port, self.duration + 10)
+                results.append(None)
+                continue
+            
+            if proc.returncode != 0:
+                logger.error("iperf3 failed: %s", stderr.decode(errors='replace'))
+                results.append(None)
+                continue
+            
+            try:
+                results.append(self._parse_report(server, stdout))
+            except ValueError as e:
+                logger.error("Failed to parse iperf3 output: %s", e)
+                results.append(None)
+        
+        completed = [r for r in results if r]
+        if completed:
+            total_down = sum(r.download_mbps for r in completed)
+            total_up = sum(r.upload_mbps for r in completed)
+            logger.info("Concurrent iperf3 tests: %s/%s succeeded, aggregate ↓ %.2f Mbps, ↑ %.2f Mbps", len(completed), len(servers), total_down, total_up)
+        
+        return results
 
 
 class SpeedtestClient:
@@ -158,6 +627,21 @@ class SpeedtestClient:
     Tests bandwidth to nearest speedtest.net server.
     """
     
+    def __init__(self, refresh_server_every: int = 10, use_library: bool = True):
+        """
+        Initialize speedtest client.
+        
+        Args:
+            refresh_server_every: Re-pick the best server after this many
+                                  in-process tests
+            use_library: Run tests in-process through the speedtest module
+                         when available instead of spawning speedtest-cli
+        """
+        self.refresh_server_every = max(1, refresh_server_every)
+        self.use_library = use_library and speedtest_lib is not None
+        self._st = None
+        self._tests_on_server = 0
+    
     def test_bandwidth(self) -> Optional[BandwidthResult]:
         """
         Run speedtest-cli bandwidth test.
@@ -167,35 +651,42 @@ class SpeedtestClient:
         """
         logger.info("Starting speedtest...")
         
+        if self.use_library:
+            try:
+                return self._test_bandwidth_library()
+            except Exception as e:
+                logger.debug("In-process speedtest failed (%s), falling back to speedtest-cli", e)
+                self._st = None
+        
         try:
             # Run speedtest-cli with JSON output
-            cmd = ["speedtest-cli", "--json"]
+            cmd = [shutil.which("speedtest-cli") or "speedtest-cli", "--json"]
             
             result = subprocess.run(
                 cmd,
                 capture_output=True,
-                text=True,
-                timeout=60
+                timeout=60,
+                **_spawn_kwargs()
             )
             
             if result.returncode != 0:
-                logger.error(f"speedtest failed: {result.stderr}")
+                logger.error("speedtest failed: %s", result.stderr.decode(errors='replace'))
                 return None
             
-            # Parse JSON output
-            data = json.loads(result.stdout)
+            # Parse JSON output straight from the raw stdout bytes
+            data = json_loads(result.stdout)
             
             # Extract data
             download_bps = data.get("download", 0)
             upload_bps = data.get("upload", 0)
             latency_ms = data.get("ping", 0)
-            server_host = data.get("server", {}).get("host", "speedtest.net")
+            server_host = _get(data, "server", "host", default="speedtest.net")
             
             # Convert to Mbps
             download_mbps = download_bps / 1_000_000
             upload_mbps = upload_bps / 1_000_000
             
-            logger.info(f"Speedtest results: ↓ {download_mbps:.2f} Mbps, ↑ {upload_mbps:.2f} Mbps, latency: {latency_ms:.1f}ms")
+            logger.info("Speedtest results: ↓ %.2f Mbps, ↑ %.2f Mbps, latency: %.1fms", download_mbps, upload_mbps, latency_ms)
             
             return BandwidthResult(
                 target=server_host,
@@ -212,13 +703,50 @@ class SpeedtestClient:
             logger.error("Speedtest timed out after 60s")
             return None
         except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse speedtest output: {e}")
+            logger.error("Failed to parse speedtest output: %s", e)
             return None
         except Exception as e:
-            logger.error(f"Speedtest failed: {e}")
+            logger.error("Speedtest failed: %s", e)
             return None
 
 
+    def _test_bandwidth_library(self) -> BandwidthResult:
+        """
+        Run the test in-process, reusing the speedtest.net config and best
+        server between tests (no interpreter start or server list download).
+        """
+        if self._st is None:
+            self._st = speedtest_lib.Speedtest(secure=True)
+            self._tests_on_server = self.refresh_server_every
+        
+        if self._tests_on_server >= self.refresh_server_every:
+            self._st.get_servers()
+            self._st.get_best_server()
+            self._tests_on_server = 0
+        
+        self._st.download()
+        self._st.upload()
+        self._tests_on_server += 1
+        
+        results = self._st.results
+        
+        # Convert to Mbps
+        download_mbps = results.download / 1_000_000
+        upload_mbps = results.upload / 1_000_000
+        latency_ms = results.ping
+        server_host = results.server.get("host", "speedtest.net")
+        
+        logger.info("Speedtest results: ↓ %.2f Mbps, ↑ %.2f Mbps, latency: %.1fms", download_mbps, upload_mbps, latency_ms)
+        
+        return BandwidthResult(
+            target=server_host,
+            download_mbps=download_mbps,
+            upload_mbps=upload_mbps,
+            latency_ms=latency_ms,
+            test_type="speedtest"
+        )
+
+
 # Public iperf3 servers for testing
 PUBLIC_IPERF3_SERVERS = [
     {"host": "ping.online.net", "port": 5201, "location": "France"},
@@ -228,48 +756,108 @@ PUBLIC_IPERF3_SERVERS = [
 ]
 
 
-def test_public_servers(max_servers: int = 3) -> List[BandwidthResult]:
+PUBLIC_SERVER_RANKING_FILE = Path.home() / ".cache" / "intermap" / "iperf_servers.json"
+PUBLIC_SERVER_RANKING_TTL = 24 * 3600  # seconds
+
+
+def _rank_public_servers(timeout: float = 3) -> List[dict]:
     """
-    Test bandwidth to multiple public iperf3 servers.
+    Order PUBLIC_IPERF3_SERVERS by TCP connect time, closest first, with
+    unreachable servers last. The order is cached on disk for a day.
+    
+    Args:
+        timeout: Seconds to wait for connections when re-ranking
+        
+    Returns:
+        The PUBLIC_IPERF3_SERVERS entries in ranked order
+    """
+    by_addr = {(s["host"], s["port"]): s for s in PUBLIC_IPERF3_SERVERS}
+    
+    try:
+        cached = json_loads(PUBLIC_SERVER_RANKING_FILE.read_bytes())
+        order = [tuple(addr) for addr in cached["order"]]
+        # Only trust the cache if it's fresh and ranks the current server list
+        if time.time() - cached["ts"] < PUBLIC_SERVER_RANKING_TTL and set(order) == set(by_addr):
+            return [by_addr[addr] for addr in order]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    
+    times = _connect_times(list(by_addr), timeout)
+    order = sorted(by_addr, key=lambda addr: (times[addr] is None, times[addr] or 0.0))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Ranked public iperf3 servers: %s", [f'{h}:{p}' for h, p in order])
+    
+    try:
+        PUBLIC_SERVER_RANKING_FILE.parent.mkdir(parents=True, exist_ok=True)
+        PUBLIC_SERVER_RANKING_FILE.write_text(json.dumps({"ts": time.time(), "order": order}))
+    except OSError as e:
+        logger.debug("Could not save public server ranking: %s", e)
+    
+    return [by_addr[addr] for addr in order]
+
+
+def test_public_servers(max_servers: int = 3, serialize: bool = True) -> List[BandwidthResult]:
+    """
+    Test bandwidth to the closest public iperf3 servers.
+    
+    Tests run one at a time by default. With serialize=False they run
+    concurrently and finish sooner, but share the local uplink, so the
+    reported speeds are contended and each one understates that server's
+    bandwidth.
     
     Args:
         max_servers: Maximum number of servers to test
+        serialize: If False, test servers concurrently (contended results)
         
     Returns:
         List of BandwidthResult objects
     """
-    results = []
     client = IPerf3Client(duration=5)  # Shorter duration for multiple tests
+    servers = _rank_public_servers()[:max_servers]
     
-    for server_info in PUBLIC_IPERF3_SERVERS[:max_servers]:
-        host = server_info["host"]
-        port = server_info["port"]
-        location = server_info["location"]
-        
-        logger.info(f"Testing {host} ({location})...")
-        
-        result = client.test_bandwidth(host, port)
-        if result:
-            results.append(result)
+    if not servers:
+        return []
     
-    return results
+    for server_info in servers:
+        logger.info("Testing %s (%s)...", server_info['host'], server_info['location'])
+    
+    if serialize:
+        results = [client.test_bandwidth(s["host"], s["port"]) for s in servers]
+    else:
+        with ThreadPoolExecutor(max_workers=len(servers)) as executor:
+            futures = [executor.submit(client.test_bandwidth, s["host"], s["port"]) for s in servers]
+            results = [f.result() for f in futures]
+    
+    return [result for result in results if result]
 
 
 class BandwidthTestManager:
     """
-    Manages sequential bandwidth testing with peak result tracking.
-    Ensures only one test runs at a time and tracks peak results per target.
+    Manages bandwidth testing with peak result tracking.
+    Runs one test at a time unless parallel_tests is raised, and tracks
+    peak results per target.
     """
     
-    def __init__(self, duration: int = 10):
+    def __init__(self, duration: int = 10, parallel_tests: int = 1, pin_cpus: bool = False,
+                 zero_copy: bool = True, window: Optional[str] = None, cport_base: Optional[int] = None):
         """
         Initialize bandwidth test manager.
         
         Args:
             duration: Duration for each iperf3 test in seconds
+            parallel_tests: Number of targets to test at the same time in
+                            test_all_targets (1 = sequential)
+            pin_cpus: Pin concurrent iperf3 processes to separate cores
+            zero_copy: Send with sendfile() (iperf3 -Z) where supported
+            window: TCP window / socket buffer size (iperf3 -w, e.g. "4M")
+            cport_base: First client port for concurrent tests (test i in a
+                        batch binds cport_base + i); None for ephemeral ports
         """
-        self.client = IPerf3Client(duration=duration)
-        self.peak_results: Dict[str, BandwidthResult] = {}  # target -> peak result
+        self.client = IPerf3Client(duration=duration, zero_copy=zero_copy, window=window)
+        self.parallel_tests = max(1, parallel_tests)
+        self.pin_cpus = pin_cpus
+        self.cport_base = cport_base
+        self.peak_results = _PeakTable()  # target -> peak result
         self.test_count = 0
     
     def probe_targets(self, targets: List[str], port: int = 5201) -> List[str]:
@@ -283,14 +871,16 @@ class BandwidthTestManager:
         Returns:
             List of targets that have iperf3 servers running
         """
-        logger.info(f"Probing {len(targets)} targets for iperf3 servers...")
-        available = []
+        cached_ok, cached_bad, unknown = IPerf3Client.split_by_probe_cache(targets, port)
+        logger.info("Probing %s of %s targets for iperf3 servers (%s cached up, %s cached down)...", len(unknown), len(targets), len(cached_ok), len(cached_bad))
         
-        for target in targets:
-            if IPerf3Client.probe_server(target, port):
-                available.append(target)
+        # Only uncached targets are probed; they're all in flight at once on
+        # a single selector
+        reachable = IPerf3Client.probe_servers(unknown, port)
+        reachable.update(dict.fromkeys(cached_ok, True))
+        available = [target for target in targets if reachable.get(target)]
         
-        logger.info(f"Found {len(available)}/{len(targets)} targets with iperf3 servers")
+        logger.info("Found %s/%s targets with iperf3 servers", len(available), len(targets))
         return available
     
     def test_target(self, target: str, port: int = 5201, tracer=None) -> tuple[Optional[BandwidthResult], List]:
@@ -307,51 +897,87 @@ class BandwidthTestManager:
         Returns:
             Tuple of (BandwidthResult if successful, List of hops in path)
         """
-        logger.info(f"[Test {self.test_count + 1}] Testing {target}:{port}")
+        logger.info("[Test %s] Testing %s:%s", self.test_count + 1, target, port)
         
         # Get traceroute path if tracer provided
         hops = []
         if tracer:
-            logger.info(f"Tracerouting to {target} before bandwidth test...")
+            logger.info("Tracerouting to %s before bandwidth test...", target)
             hops = tracer.trace(target)
             if hops:
-                logger.info(f"Path to {target}: {len(hops)} hops")
+                logger.info("Path to %s: %s hops", target, len(hops))
         
         # Run test
         result = self.client.test_bandwidth(target, port)
         
         if result:
-            self.test_count += 1
-            
-            # Update peak result if this is better
-            if target not in self.peak_results:
-                result.peak = True
-                self.peak_results[target] = result
-                logger.info(f"New peak for {target}: {result.download_mbps:.2f} Mbps")
-            else:
-                prev_peak = self.peak_results[target]
-                current_total = result.download_mbps + result.upload_mbps
-                peak_total = prev_peak.download_mbps + prev_peak.upload_mbps
-                
-                if current_total > peak_total:
-                    # This is a new peak
-                    prev_peak.peak = False
-                    result.peak = True
-                    self.peak_results[target] = result
-                    logger.info(f"New peak for {target}: {result.download_mbps:.2f} Mbps (previous: {prev_peak.download_mbps:.2f})")
-                else:
-                    logger.info(f"Not a peak for {target}: {result.download_mbps:.2f} Mbps (peak: {prev_peak.download_mbps:.2f})")
+            self._record_result(target, result)
         
         return result, hops
     
+    def _record_result(self, target: str, result: BandwidthResult):
+        """Count a successful test and update the peak result for target."""
+        self.test_count += 1
+        
+        # Update peak result if this is better
+        is_peak, prev_download = self.peak_results.update(target, result)
+        result.peak = is_peak
+        
+        if prev_download is None:
+            logger.info("New peak for %s: %.2f Mbps", target, result.download_mbps)
+        elif is_peak:
+            logger.info("New peak for %s: %.2f Mbps (previous: %.2f)", target, result.download_mbps, prev_download)
+        else:
+            logger.info("Not a peak for %s: %.2f Mbps (peak: %.2f)", target, result.download_mbps, prev_download)
+    
+    def _test_targets_concurrently(self, targets: List[str], port: int, tracer=None) -> List[Tuple[BandwidthResult, List]]:
+        """Test targets in groups of parallel_tests concurrent iperf3 processes."""
+        logger.info("Testing %s targets, %s at a time...", len(targets), self.parallel_tests)
+        results = []
+        
+        for start in range(0, len(targets), self.parallel_tests):
+            batch = targets[start:start + self.parallel_tests]
+            logger.info("Progress: %s/%s", start + len(batch), len(targets))
+            
+            # Trace first so the paths aren't measured under test load
+            paths = []
+            for target in batch:
+                hops = []
+                if tracer:
+                    logger.info("Tracerouting to %s before bandwidth test...", target)
+                    hops = tracer.trace(target)
+                    if hops:
+                        logger.info("Path to %s: %s hops", target, len(hops))
+                paths.append(hops)
+            
+            batch_results = self.client.test_many([(t, port) for t in batch], cport_base=self.cport_base,
+                                                  pin_cpus=self.pin_cpus)
+            
+            for target, result, hops in zip(batch, batch_results, paths):
+                if result:
+                    self._record_result(target, result)
+                    results.append((result, hops))
+            
+            # Brief pause between batches that may congest the same links
+            next_batch = targets[start + self.parallel_tests:start + 2 * self.parallel_tests]
+            if next_batch:
+                pause = _pause_between(batch, next_batch)
+                if pause:
+                    time.sleep(pause)
+        
+        logger.info("Completed %s/%s bandwidth tests", len(results), len(targets))
+        return results
+    
     def test_all_targets(self, targets: List[str], port: int = 5201, probe_first: bool = True, tracer=None) -> List[Tuple[BandwidthResult, List]]:
         """
-        Test bandwidth to all targets sequentially.
+        Test bandwidth to all targets, sequentially unless parallel_tests > 1.
         
         Args:
             targets: List of IP addresses or hostnames
             port: iperf3 port
-            probe_first: If True, probe targets before testing
+            probe_first: If True, check targets for iperf3 servers before
+                         testing; targets with a fresh probe-cache entry
+                         are not probed again
             tracer: Optional Traceroute instance to get paths
             
         Returns:
@@ -365,21 +991,91 @@ class BandwidthTestManager:
             logger.warning("No targets available for testing")
             return []
         
-        logger.info(f"Testing {len(targets)} targets sequentially...")
+        if self.parallel_tests > 1:
+            return self._test_targets_concurrently(targets, port, tracer)
+        
+        logger.info("Testing %s targets sequentially...", len(targets))
         results = []
         
         for i, target in enumerate(targets, 1):
-            logger.info(f"Progress: {i}/{len(targets)}")
+            logger.info("Progress: %s/%s", i, len(targets))
             result, hops = self.test_target(target, port, tracer)
             
             if result:
                 results.append((result, hops))
+                
+                # Brief pause if the next test may congest the same links
+                if i < len(targets):
+                    pause = _pause_between([target], [targets[i]])
+                    if pause:
+                        time.sleep(pause)
+        
+        logger.info("Completed %s/%s bandwidth tests", len(results), len(targets))
+        return results
+    
+    async def test_target_async(self, target: str, port: int = 5201, tracer=None) -> Tuple[Optional[BandwidthResult], List]:
+        """
+        Async version of test_target; the traceroute runs in a worker thread
+        and the iperf3 test as an asyncio subprocess.
+        
+        Args:
+            target: IP address or hostname
+            port: iperf3 port
+            tracer: Optional Traceroute instance to get path before testing
             
-            # Brief pause between tests to avoid congestion
-            if i < len(targets):
-                time.sleep(2)
+        Returns:
+            Tuple of (BandwidthResult if successful, List of hops in path)
+        """
+        hops = []
+        if tracer:
+            logger.info("Tracerouting to %s before bandwidth test...", target)
+            hops = await asyncio.get_running_loop().run_in_executor(None, tracer.trace, target)
+            if hops:
+                logger.info("Path to %s: %s hops", target, len(hops))
+        
+        result = await self.client.test_bandwidth_async(target, port)
+        
+        if result:
+            # No await in between, so peak updates can't interleave
+            self._record_result(target, result)
+        
+        return result, hops
+    
+    async def test_all_targets_async(self, targets: List[str], port: int = 5201, probe_first: bool = True, tracer=None) -> List[Tuple[BandwidthResult, List]]:
+        """
+        Test bandwidth to all targets from the event loop, with at most
+        parallel_tests tests in flight at once.
+        
+        Args:
+            targets: List of IP addresses or hostnames
+            port: iperf3 port
+            probe_first: If True, check targets for iperf3 servers before
+                         testing; targets with a fresh probe-cache entry
+                         are not probed again
+            tracer: Optional Traceroute instance to get paths
+            
+        Returns:
+            List of tuples (BandwidthResult, hops_list) for successful tests
+        """
+        if probe_first:
+            # Filter to only targets with iperf3 servers
+            targets = await asyncio.get_running_loop().run_in_executor(None, self.probe_targets, targets, port)
+        
+        if not targets:
+            logger.warning("No targets available for testing")
+            return []
+        
+        logger.info("Testing %s targets, %s at a time...", len(targets), self.parallel_tests)
+        sem = asyncio.Semaphore(self.parallel_tests)
+        
+        async def run(target):
+            async with sem:
+                return await self.test_target_async(target, port, tracer)
+        
+        outcomes = await asyncio.gather(*(run(target) for target in targets))
+        results = [(result, hops) for result, hops in outcomes if result]
         
-        logger.info(f"Completed {len(results)}/{len(targets)} bandwidth tests")
+        logger.info("Completed %s/%s bandwidth tests", len(results), len(targets))
         return results
     
     def get_peak_results(self) -> List[BandwidthResult]:
@@ -389,7 +1085,7 @@ class BandwidthTestManager:
         Returns:
             List of peak BandwidthResult objects
         """
-        return list(self.peak_results.values())
+        return self.peak_results.all()
     
     def get_peak_for_target(self, target: str) -> Optional[BandwidthResult]:
         """
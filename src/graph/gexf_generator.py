@@ -7,14 +7,167 @@ Licensed under CC-BY-NC-SA 4.0
 GEXF file generator for network topology visualization
 """
 import logging
+import hashlib
 import ipaddress
-from typing import List, Dict
+import math
+import os
+import sys
+import threading
+from typing import List, Dict, Iterable, Optional
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime
-from xml.etree.ElementTree import Element, SubElement, tostring, ElementTree
-from xml.dom import minidom
+from functools import lru_cache
+from itertools import count, islice
+from xml.sax.saxutils import escape, quoteattr
+
+try:
+    import numpy as np  # Vectorized bandwidth categorization and hop RTT deltas
+except ImportError:
+    np = None
 
 logger = logging.getLogger(__name__)
 
+GEXF_NAMESPACE = "http://gexf.net/1.3"
+
+# Attribute definitions: (id, title, type)
+NODE_ATTRIBUTES = [
+    ("0", "hostname", "string"),
+    ("1", "type", "string"),
+    ("2", "is_participant", "boolean"),
+]
+EDGE_ATTRIBUTES = [
+    ("0", "rtt_ms", "float"),
+    ("1", "bandwidth_download_mbps", "float"),
+    ("2", "bandwidth_upload_mbps", "float"),
+    ("3", "speed_category", "string"),
+]
+
+# The document is written from these templates; only the node and edge rows
+# depend on the graph. Every row starts with its own newline and indentation.
+# (lastmodifieddate, escaped title, node attribute rows, edge attribute rows)
+GEXF_HEADER = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    f'\n<gexf xmlns="{GEXF_NAMESPACE}" version="1.3">'
+    '\n  <meta lastmodifieddate="%s">'
+    '\n    <creator>Distributed Internet Topology Mapper</creator>'
+    '\n    <description>%s</description>'
+    '\n  </meta>'
+    '\n  <graph mode="static" defaultedgetype="undirected">'
+    '\n    <attributes class="node">%s'
+    '\n    </attributes>'
+    '\n    <attributes class="edge">%s'
+    '\n    </attributes>'
+    '\n    <nodes>'
+)
+ATTRIBUTE_TEMPLATE = '\n      <attribute id="%s" title="%s" type="%s"/>'
+NODES_TO_EDGES = b'\n    </nodes>\n    <edges>'
+GEXF_FOOTER = b'\n    </edges>\n  </graph>\n</gexf>\n'
+
+# (quoted id, quoted label, quoted hostname, type, is_participant)
+NODE_TEMPLATE = (
+    '\n      <node id=%s label=%s>'
+    '\n        <attvalues>'
+    '\n          <attvalue for="0" value=%s/>'
+    '\n          <attvalue for="1" value="%s"/>'
+    '\n          <attvalue for="2" value="%s"/>'
+    '\n        </attvalues>'
+    '\n      </node>'
+)
+
+# (id, quoted source, quoted target, optional length/weight, color, attvalues)
+EDGE_TEMPLATE = (
+    '\n      <edge id="%d" source=%s target=%s%s color="%s">'
+    '\n        <attvalues>%s'
+    '\n        </attvalues>'
+    '\n      </edge>'
+)
+ATTVALUE_TEMPLATE = '\n          <attvalue for="%s" value="%s"/>'
+
+
+# Rows joined into one string per write; bounds memory while keeping
+# encode()/write() calls off the per-row path
+ROWS_PER_WRITE = 4096
+
+# Digests of merged traceroutes kept for skipping repeats; the least recently
+# seen are forgotten first
+SEEN_TRACES_SIZE = 65536
+
+
+def _write_rows(f, rows: Iterable[str]):
+    """Write rendered rows to binary file f, ROWS_PER_WRITE at a time."""
+    rows = iter(rows)
+    while True:
+        chunk = "".join(islice(rows, ROWS_PER_WRITE))
+        if not chunk:
+            return
+        f.write(chunk.encode("utf-8"))
+
+
+@lru_cache(maxsize=65536)
+def _quoteattr(value: str) -> str:
+    """quoteattr() memoized across calls; node ids recur in every incident edge."""
+    return quoteattr(value)
+
+
+def _segment_rtt_kernel(rtts):
+    # Each hop's RTT is cumulative from source, so difference = segment time;
+    # NaN where either hop's RTT is unknown
+    return np.where((rtts[:-1] > 0) & (rtts[1:] > 0), np.abs(np.diff(rtts)), np.nan)
+
+
+def _segment_rtts(hops: List[Dict]) -> List[Optional[float]]:
+    """
+    RTT of each segment between consecutive traceroute hops.
+    
+    Args:
+        hops: Traceroute hops, each with an optional cumulative "rtt"
+        
+    Returns:
+        len(hops) - 1 segment RTTs in ms (None if unknown)
+    """
+    if np is None or len(hops) < 2:
+        segments = []
+        for current_hop, next_hop in zip(hops, hops[1:]):
+            current_rtt = current_hop.get("rtt") or 0
+            next_rtt = next_hop.get("rtt") or 0
+            segments.append(abs(next_rtt - current_rtt) if current_rtt > 0 and next_rtt > 0 else None)
+        return segments
+    
+    rtts = np.fromiter((hop.get("rtt") or 0.0 for hop in hops), dtype=np.float64, count=len(hops))
+    return [None if math.isnan(rtt) else rtt for rtt in _segment_rtt_kernel(rtts).tolist()]
+
+
+def _tmp_path_for(filepath: str) -> str:
+    """
+    Hidden temp path next to filepath (same filesystem, so os.replace is atomic).
+    
+    The name is unique per process and thread, so concurrent writers of the
+    same file never share (and truncate) each other's temp file.
+    """
+    directory, name = os.path.split(str(filepath))
+    return os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+@dataclass(slots=True)
+class EdgeData:
+    """
+    Metrics for one undirected edge.
+    
+    Unknown metrics are stored as math.inf (RTT) / -math.inf (bandwidth)
+    so updates are a plain min()/max(); see _known().
+    """
+    rtt_ms: float = math.inf  # Best (lowest) RTT seen
+    bandwidth_down_mbps: float = -math.inf  # Peak download bandwidth
+    bandwidth_up_mbps: float = -math.inf  # Peak upload bandwidth
+    attributes: Optional[Dict] = None  # Extra add_edge() keyword attributes
+
+
+def _known(value: float) -> Optional[float]:
+    """Map EdgeData's inf/-inf unknown sentinels back to None."""
+    return None if math.isinf(value) else value
+
 
 class NetworkGraph:
     """
@@ -26,7 +179,9 @@ class NetworkGraph:
     
     def __init__(self):
         self.nodes: Dict[str, Dict] = {}  # ip -> node data
-        self.edges: Dict[tuple, Dict] = {}  # (source_ip, target_ip) -> edge data
+        self.edges: Dict[tuple, EdgeData] = {}  # (source_ip, target_ip) -> edge data
+        self.adj: Dict[str, set] = {}  # ip -> neighbor ips (for O(degree) removal)
+        self._seen_traces: "OrderedDict[bytes, None]" = OrderedDict()  # digests of traceroutes already merged, LRU
         
     def add_node(self, ip_address: str, hostname: str = None, **attributes):
         """
@@ -37,13 +192,18 @@ class NetworkGraph:
             hostname: Optional hostname
             **attributes: Additional node attributes
         """
+        # Intern ids so the copies in node data, edge keys and adj share storage
+        ip_address = sys.intern(ip_address)
         if ip_address not in self.nodes:
+            if hostname:
+                hostname = sys.intern(hostname)
             self.nodes[ip_address] = {
                 "ip": ip_address,
                 "hostname": hostname or ip_address,
                 **attributes
             }
-            logger.debug(f"Added node: {ip_address}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Added node: %s", ip_address)
     
     def add_edge(self, source_ip: str, target_ip: str, rtt_ms: float = None, bandwidth_down_mbps: float = None, bandwidth_up_mbps: float = None, **attributes):
         """
@@ -57,39 +217,45 @@ class NetworkGraph:
             bandwidth_up_mbps: Upload bandwidth in Mbps
             **attributes: Additional edge attributes
         """
-        # Ensure nodes exist
-        self.add_node(source_ip)
-        self.add_node(target_ip)
+        source_ip = sys.intern(source_ip)
+        target_ip = sys.intern(target_ip)
         
-        # Add edge with RTT and bandwidth (undirected - store in sorted order)
-        edge_key = tuple(sorted([source_ip, target_ip]))
+        # Ensure nodes exist (checked here to skip the add_node call for known nodes)
+        nodes = self.nodes
+        if source_ip not in nodes:
+            self.add_node(source_ip)
+        if target_ip not in nodes:
+            self.add_node(target_ip)
         
-        edge_data = {
-            "rtt_ms": rtt_ms,
-            "bandwidth_down_mbps": bandwidth_down_mbps,
-            "bandwidth_up_mbps": bandwidth_up_mbps,
-            **attributes
-        }
+        # Add edge with RTT and bandwidth (undirected - store in sorted order)
+        edge_key = (source_ip, target_ip) if source_ip <= target_ip else (target_ip, source_ip)
+        self._upsert_edge(edge_key, rtt_ms, bandwidth_down_mbps, bandwidth_up_mbps, **attributes)
+    
+    def _upsert_edge(self, edge_key: tuple, rtt_ms: float = None, bandwidth_down_mbps: float = None, bandwidth_up_mbps: float = None, **attributes):
+        """
+        Insert or update an edge whose key is already in sorted order and
+        whose endpoints are already nodes.
+        """
+        source_ip, target_ip = edge_key
         
-        # If edge exists, update with better metrics
-        if edge_key in self.edges:
-            existing_rtt = self.edges[edge_key].get("rtt_ms")
-            if existing_rtt is None or (rtt_ms is not None and rtt_ms < existing_rtt):
-                self.edges[edge_key]["rtt_ms"] = rtt_ms
+        edge_data = self.edges.get(edge_key)
+        if edge_data is None:
+            edge_data = self.edges[edge_key] = EdgeData(attributes=attributes or None)
+            self.adj.setdefault(source_ip, set()).add(target_ip)
+            self.adj.setdefault(target_ip, set()).add(source_ip)
             
-            # Update download bandwidth (keep higher/peak value)
-            existing_bw = self.edges[edge_key].get("bandwidth_down_mbps")
-            if bandwidth_down_mbps is not None and (existing_bw is None or bandwidth_down_mbps > existing_bw):
-                self.edges[edge_key]["bandwidth_down_mbps"] = bandwidth_down_mbps
-            
-            # Update upload bandwidth (keep higher/peak value)
-            existing_up = self.edges[edge_key].get("bandwidth_up_mbps")
-            if bandwidth_up_mbps is not None and (existing_up is None or bandwidth_up_mbps > existing_up):
-                self.edges[edge_key]["bandwidth_up_mbps"] = bandwidth_up_mbps
-        else:
-            self.edges[edge_key] = edge_data
-            
-            logger.debug(f"Added edge: {source_ip} <-> {target_ip} (RTT: {rtt_ms}ms, Down: {bandwidth_down_mbps}Mbps, Up: {bandwidth_up_mbps}Mbps)")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Added edge: %s <-> %s (RTT: %sms, Down: %sMbps, Up: %sMbps)",
+                             source_ip, target_ip, rtt_ms, bandwidth_down_mbps, bandwidth_up_mbps)
+        
+        # Keep the best metrics (lowest RTT, higher/peak bandwidth); the
+        # unknown sentinels lose every comparison against a measurement
+        if rtt_ms is not None:
+            edge_data.rtt_ms = min(edge_data.rtt_ms, rtt_ms)
+        if bandwidth_down_mbps is not None:
+            edge_data.bandwidth_down_mbps = max(edge_data.bandwidth_down_mbps, bandwidth_down_mbps)
+        if bandwidth_up_mbps is not None:
+            edge_data.bandwidth_up_mbps = max(edge_data.bandwidth_up_mbps, bandwidth_up_mbps)
     
     def remove_node(self, ip_address: str):
         """
@@ -104,16 +270,18 @@ class NetworkGraph:
         # Remove node
         del self.nodes[ip_address]
         
-        # Remove all edges connected to this node
-        edges_to_remove = [
-            edge_key for edge_key in self.edges.keys()
-            if ip_address in edge_key
-        ]
+        # Traces through this node must be merged again if they reappear
+        self._seen_traces.clear()
         
-        for edge_key in edges_to_remove:
-            del self.edges[edge_key]
-        
-        logger.debug(f"Removed node {ip_address} and {len(edges_to_remove)} edges")
+        # Remove all edges connected to this node
+        neighbors = self.adj.pop(ip_address, ())
+        for neighbor in neighbors:
+            edge_key = (ip_address, neighbor) if ip_address <= neighbor else (neighbor, ip_address)
+            self.edges.pop(edge_key, None)
+            if neighbor != ip_address:  # self-loop from a repeated hop
+                self.adj[neighbor].discard(ip_address)
+        
+        logger.debug("Removed node %s and %d edges", ip_address, len(neighbors))
     
     def merge_traceroute(self, traceroute_result: Dict):
         """
@@ -124,8 +292,25 @@ class NetworkGraph:
         """
         hops = traceroute_result.get("hops", [])
         
-        # Add nodes for each hop
+        # Peers report the same paths over and over; merging an identical hop
+        # list (IPs and RTTs) again cannot change the graph, so skip it
+        digest = hashlib.blake2b(
+            "\n".join(f"{hop['ip']} {hop.get('rtt')}" for hop in hops).encode("utf-8"),
+            digest_size=8,
+        ).digest()
+        seen = self._seen_traces
+        if digest in seen:
+            seen.move_to_end(digest)
+            return
+        seen[digest] = None
+        if len(seen) > SEEN_TRACES_SIZE:
+            seen.popitem(last=False)
+        
+        # Add nodes for each hop not seen yet
+        nodes = self.nodes
         for hop in hops:
+            if hop["ip"] in nodes:
+                continue
             self.add_node(
                 ip_address=hop["ip"],
                 hostname=hop.get("hostname"),
@@ -133,26 +318,23 @@ class NetworkGraph:
                 rtt=hop.get("rtt")
             )
         
-        # Add edges between consecutive hops with RTT as weight
-        for i in range(len(hops) - 1):
-            current_hop = hops[i]
-            next_hop = hops[i + 1]
+        # Add edges between consecutive hops with RTT BETWEEN hops (segment latency)
+        # as weight (every hop is a node by now, so go straight to _upsert_edge)
+        intern = sys.intern
+        get_edge = self.edges.get
+        upsert_edge = self._upsert_edge
+        for current_hop, next_hop, edge_rtt in zip(hops, hops[1:], _segment_rtts(hops)):
+            current_ip = intern(current_hop["ip"])
+            next_ip = intern(next_hop["ip"])
             
-            # Calculate RTT BETWEEN hops (segment latency)
-            # Each hop's RTT is cumulative from source, so difference = segment time
-            current_rtt = current_hop.get("rtt", 0)
-            next_rtt = next_hop.get("rtt", 0)
+            edge_key = (current_ip, next_ip) if current_ip <= next_ip else (next_ip, current_ip)
             
-            if current_rtt > 0 and next_rtt > 0:
-                edge_rtt = abs(next_rtt - current_rtt)  # Absolute difference
-            else:
-                edge_rtt = None  # Unknown latency
-                
-            self.add_edge(
-                current_hop["ip"], 
-                next_hop["ip"],
-                rtt_ms=edge_rtt
-            )
+            # Traces share long hop prefixes; skip pairs already merged with an RTT at least as good
+            existing = get_edge(edge_key)
+            if existing is not None and (edge_rtt is None or existing.rtt_ms <= edge_rtt):
+                continue
+            
+            upsert_edge(edge_key, rtt_ms=edge_rtt)
 
 
 class GEXFGenerator:
@@ -179,14 +361,32 @@ class GEXFGenerator:
         "unknown": "888888"        # Gray: no bandwidth data
     }
     
-    def __init__(self, graph: NetworkGraph):
+    # Lower bounds (Mbps, ascending) of each category after the first
+    BANDWIDTH_THRESHOLDS = [1, 10, 100, 1000, 2500, 5000, 10000, 25000, 40000, 100000]
+    BANDWIDTH_CATEGORIES = [
+        "very_slow", "slow", "medium", "fast", "gigabit",
+        "2.5gig", "5gig", "10gig", "25gig", "40gig", "100gig",
+    ]
+    if np is not None:
+        _THRESHOLDS_ARRAY = np.array(BANDWIDTH_THRESHOLDS, dtype=np.float64)
+        _CATEGORIES_ARRAY = np.array(BANDWIDTH_CATEGORIES, dtype=object)
+    
+    def __init__(self, graph: NetworkGraph, include_upload: bool = True, use_rtt_length: bool = True):
         """
         Initialize GEXF generator with a network graph.
         
         Args:
             graph: NetworkGraph instance
+            include_upload: Emit the upload bandwidth attribute and its values
+            use_rtt_length: Set each edge's length to its RTT
         """
         self.graph = graph
+        self.include_upload = include_upload
+        self.use_rtt_length = use_rtt_length
+        self.edge_attributes = [
+            definition for definition in EDGE_ATTRIBUTES
+            if include_upload or definition[1] != "bandwidth_upload_mbps"
+        ]
     
     def _detect_node_type(self, node_id: str, node_data: Dict) -> str:
         """
@@ -230,10 +430,14 @@ class GEXFGenerator:
         # Default to router for public IPs
         return "router"
     
-    def _categorize_bandwidth(self, bandwidth_mbps: float = None) -> tuple:
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _categorize_bandwidth(bandwidth_mbps: float = None) -> tuple:
         """
         Categorize bandwidth and return category name and color.
         
+        Link speeds cluster around a few values, so results are cached.
+        
         Args:
             bandwidth_mbps: Bandwidth in Mbps
             
@@ -241,190 +445,140 @@ class GEXFGenerator:
             Tuple of (category_name, color_hex)
         """
         if bandwidth_mbps is None:
-            return ("unknown", self.BANDWIDTH_COLORS["unknown"])
-        elif bandwidth_mbps >= 100000:  # >= 100 Gbps
-            return ("100gig", self.BANDWIDTH_COLORS["100gig"])
-        elif bandwidth_mbps >= 40000:   # >= 40 Gbps
-            return ("40gig", self.BANDWIDTH_COLORS["40gig"])
-        elif bandwidth_mbps >= 25000:   # >= 25 Gbps
-            return ("25gig", self.BANDWIDTH_COLORS["25gig"])
-        elif bandwidth_mbps >= 10000:   # >= 10 Gbps
-            return ("10gig", self.BANDWIDTH_COLORS["10gig"])
-        elif bandwidth_mbps >= 5000:    # >= 5 Gbps
-            return ("5gig", self.BANDWIDTH_COLORS["5gig"])
-        elif bandwidth_mbps >= 2500:    # >= 2.5 Gbps
-            return ("2.5gig", self.BANDWIDTH_COLORS["2.5gig"])
-        elif bandwidth_mbps >= 1000:    # >= 1 Gbps
-            return ("gigabit", self.BANDWIDTH_COLORS["gigabit"])
-        elif bandwidth_mbps >= 100:
-            return ("fast", self.BANDWIDTH_COLORS["fast"])
-        elif bandwidth_mbps >= 10:
-            return ("medium", self.BANDWIDTH_COLORS["medium"])
-        elif bandwidth_mbps >= 1:
-            return ("slow", self.BANDWIDTH_COLORS["slow"])
+            category = "unknown"
         else:
-            return ("very_slow", self.BANDWIDTH_COLORS["very_slow"])
+            category = GEXFGenerator.BANDWIDTH_CATEGORIES[bisect_right(GEXFGenerator.BANDWIDTH_THRESHOLDS, bandwidth_mbps)]
+        return (category, GEXFGenerator.BANDWIDTH_COLORS[category])
+    
+    def _categorize_bandwidths(self, bandwidths: List[float]) -> List[str]:
+        """
+        Categorize many bandwidths at once.
+        
+        Args:
+            bandwidths: Bandwidths in Mbps (None if unknown)
+            
+        Returns:
+            Category name for each bandwidth
+        """
+        if np is None:
+            return [self._categorize_bandwidth(bandwidth)[0] for bandwidth in bandwidths]
+        
+        values = np.array([np.nan if bandwidth is None else bandwidth for bandwidth in bandwidths], dtype=np.float64)
+        categories = self._CATEGORIES_ARRAY[np.searchsorted(self._THRESHOLDS_ARRAY, values, side="right")]
+        categories[np.isnan(values)] = "unknown"
+        return categories.tolist()
+    
+    def _node_xml(self, node_id: str, node_data: Dict) -> str:
+        """
+        Serialize a node straight from NODE_TEMPLATE.
+        
+        Args:
+            node_id: Node IP address
+            node_data: Node data dictionary
+            
+        Returns:
+            <node> element
+        """
+        hostname = _quoteattr(node_data.get("hostname", node_id))
+        
+        # Detect node type
+        node_type = self._detect_node_type(node_id, node_data)
+        
+        # Is participant flag
+        is_participant = str(node_data.get("is_participant", False)).lower()
+        
+        return NODE_TEMPLATE % (_quoteattr(node_id), hostname, hostname, node_type, is_participant)
+    
+    def _edge_xml(self, edge_id: int, edge_key: tuple, edge_data: EdgeData, speed_category: str) -> str:
+        """
+        Serialize an edge straight from EDGE_TEMPLATE.
+        
+        Args:
+            edge_id: Sequential edge id
+            edge_key: (source, target) node ids
+            edge_data: Edge metrics
+            speed_category: Category of the edge's download bandwidth
+            
+        Returns:
+            <edge> element
+        """
+        source, target = edge_key
+        
+        # Get edge metrics
+        rtt_ms = _known(edge_data.rtt_ms)
+        bandwidth_down_mbps = _known(edge_data.bandwidth_down_mbps)
+        bandwidth_up_mbps = _known(edge_data.bandwidth_up_mbps)
+        
+        # Color based on download bandwidth
+        color = self.BANDWIDTH_COLORS[speed_category]
+        
+        optional = ""
+        attvalues = ""
+        
+        # Set edge LENGTH based on RTT (lower RTT = shorter edge for better visualization)
+        # Use RTT as length directly - visualization tools will interpret this
+        if rtt_ms is not None:
+            if self.use_rtt_length:
+                optional = f' length="{rtt_ms}"'
+            attvalues = ATTVALUE_TEMPLATE % ("0", rtt_ms)
+        
+        # Set weight (use bandwidth if available, otherwise inverse RTT)
+        if bandwidth_down_mbps is not None:
+            optional += f' weight="{bandwidth_down_mbps}"'
+            attvalues += ATTVALUE_TEMPLATE % ("1", bandwidth_down_mbps)
+        elif rtt_ms is not None:
+            optional += f' weight="{1000 / rtt_ms}"'  # Inverse RTT as weight
+        
+        if bandwidth_up_mbps is not None and self.include_upload:
+            attvalues += ATTVALUE_TEMPLATE % ("2", bandwidth_up_mbps)
+        
+        attvalues += ATTVALUE_TEMPLATE % ("3", speed_category)
+        
+        return EDGE_TEMPLATE % (edge_id, _quoteattr(source), _quoteattr(target), optional, color, attvalues)
     
     def generate(self, filepath: str, title: str = "Internet Topology Map"):
         """
         Generate GEXF file from the network graph.
         
+        The file is written from the module's text templates: nodes and
+        edges are streamed straight to disk as they are visited, so no
+        element tree is built for the whole graph.
+        
         Args:
             filepath: Output file path
             title: Graph title/description
         """
         logger.info(f"Generating GEXF file: {filepath}")
         
-        # Create root GEXF element
-        gexf = Element("gexf")
-        gexf.set("xmlns", "http://gexf.net/1.3")
-        gexf.set("version", "1.3")
-        
-        # Add metadata
-        meta = SubElement(gexf, "meta")
-        meta.set("lastmodifieddate", datetime.now().isoformat())
-        creator = SubElement(meta, "creator")
-        creator.text = "Distributed Internet Topology Mapper"
-        description = SubElement(meta, "description")
-        description.text = title
-        
-        # Create graph element
-        graph_elem = SubElement(gexf, "graph")
-        graph_elem.set("mode", "static")
-        graph_elem.set("defaultedgetype", "undirected")
-        
-        # Add node attributes definitions
-        node_attributes = SubElement(graph_elem, "attributes")
-        node_attributes.set("class", "node")
-        
-        attr_hostname = SubElement(node_attributes, "attribute")
-        attr_hostname.set("id", "0")
-        attr_hostname.set("title", "hostname")
-        attr_hostname.set("type", "string")
-        
-        attr_type = SubElement(node_attributes, "attribute")
-        attr_type.set("id", "1")
-        attr_type.set("title", "type")
-        attr_type.set("type", "string")
-        
-        attr_participant = SubElement(node_attributes, "attribute")
-        attr_participant.set("id", "2")
-        attr_participant.set("title", "is_participant")
-        attr_participant.set("type", "boolean")
-        
-        # Add edge attributes definitions (for RTT and bandwidth)
-        edge_attributes = SubElement(graph_elem, "attributes")
-        edge_attributes.set("class", "edge")
-        
-        attr_rtt = SubElement(edge_attributes, "attribute")
-        attr_rtt.set("id", "0")
-        attr_rtt.set("title", "rtt_ms")
-        attr_rtt.set("type", "float")
-        
-        attr_bandwidth = SubElement(edge_attributes, "attribute")
-        attr_bandwidth.set("id", "1")
-        attr_bandwidth.set("title", "bandwidth_download_mbps")
-        attr_bandwidth.set("type", "float")
-        
-        attr_bandwidth_up = SubElement(edge_attributes, "attribute")
-        attr_bandwidth_up.set("id", "2")
-        attr_bandwidth_up.set("title", "bandwidth_upload_mbps")
-        attr_bandwidth_up.set("type", "float")
-        
-        attr_color = SubElement(edge_attributes, "attribute")
-        attr_color.set("id", "3")
-        attr_color.set("title", "speed_category")
-        attr_color.set("type", "string")
-        
-        # Add nodes
-        nodes_elem = SubElement(graph_elem, "nodes")
-        for node_id, node_data in self.graph.nodes.items():
-            node = SubElement(nodes_elem, "node")
-            node.set("id", node_id)
-            node.set("label", node_data.get("hostname", node_id))
+        # Write to a temp file and atomically swap it in, so readers never see
+        # a partial file and hardlinked copies (topology_latest) aren't overwritten
+        tmp_path = _tmp_path_for(filepath)
+        with open(tmp_path, "wb") as f:
+            # Add metadata and node and edge attribute definitions (hostname/type, RTT and bandwidth)
+            f.write((GEXF_HEADER % (
+                datetime.now().isoformat(),
+                escape(title),
+                "".join(ATTRIBUTE_TEMPLATE % definition for definition in NODE_ATTRIBUTES),
+                "".join(ATTRIBUTE_TEMPLATE % definition for definition in self.edge_attributes),
+            )).encode("utf-8"))
             
-            # Detect node type
-            node_type = self._detect_node_type(node_id, node_data)
+            # Stream nodes
+            nodes = self.graph.nodes
+            _write_rows(f, map(self._node_xml, nodes.keys(), nodes.values()))
             
-            # Add node attributes
-            attvalues = SubElement(node, "attvalues")
+            f.write(NODES_TO_EDGES)
             
-            # Hostname
-            attvalue_hostname = SubElement(attvalues, "attvalue")
-            attvalue_hostname.set("for", "0")
-            attvalue_hostname.set("value", node_data.get("hostname", node_id))
-            
-            # Type
-            attvalue_type = SubElement(attvalues, "attvalue")
-            attvalue_type.set("for", "1")
-            attvalue_type.set("value", node_type)
-            
-            # Is participant flag
-            is_participant = str(node_data.get("is_participant", False)).lower()
-            attvalue_participant = SubElement(attvalues, "attvalue")
-            attvalue_participant.set("for", "2")
-            attvalue_participant.set("value", is_participant)
-        
-        # Add edges with RTT and bandwidth
-        edges_elem = SubElement(graph_elem, "edges")
-        for edge_id, (edge_key, edge_data) in enumerate(self.graph.edges.items()):
-            source, target = edge_key
-            edge = SubElement(edges_elem, "edge")
-            edge.set("id", str(edge_id))
-            edge.set("source", source)
-            edge.set("target", target)
-            
-            # Get edge metrics
-            rtt_ms = edge_data.get("rtt_ms")
-            bandwidth_down_mbps = edge_data.get("bandwidth_down_mbps")
-            bandwidth_up_mbps = edge_data.get("bandwidth_up_mbps")
-            
-            # Determine speed category and color based on download bandwidth
-            speed_category, color = self._categorize_bandwidth(bandwidth_down_mbps)
-            
-            # Set edge LENGTH based on RTT (lower RTT = shorter edge for better visualization)
-            # Use RTT as length directly - visualization tools will interpret this
-            if rtt_ms is not None:
-                edge.set("length", str(rtt_ms))
-            
-            # Set weight (use bandwidth if available, otherwise inverse RTT)
-            if bandwidth_down_mbps is not None:
-                edge.set("weight", str(bandwidth_down_mbps))
-            elif rtt_ms is not None:
-                edge.set("weight", str(1000 / rtt_ms))  # Inverse RTT as weight
-            
-            # Set edge color based on bandwidth
-            if color:
-                edge.set("color", color)
-            
-            # Add as attribute values
-            edge_attvalues = SubElement(edge, "attvalues")
-            
-            if rtt_ms is not None:
-                rtt_attvalue = SubElement(edge_attvalues, "attvalue")
-                rtt_attvalue.set("for", "0")
-                rtt_attvalue.set("value", str(rtt_ms))
-            
-            if bandwidth_down_mbps is not None:
-                bw_attvalue = SubElement(edge_attvalues, "attvalue")
-                bw_attvalue.set("for", "1")
-                bw_attvalue.set("value", str(bandwidth_down_mbps))
+            # Speed categories are bucketed for all edges in one pass
+            speed_categories = self._categorize_bandwidths(
+                [_known(edge_data.bandwidth_down_mbps) for edge_data in self.graph.edges.values()]
+            )
             
-            if bandwidth_up_mbps is not None:
-                bw_up_attvalue = SubElement(edge_attvalues, "attvalue")
-                bw_up_attvalue.set("for", "2")
-                bw_up_attvalue.set("value", str(bandwidth_up_mbps))
+            # Stream edges with RTT and bandwidth
+            edges = self.graph.edges
+            _write_rows(f, map(self._edge_xml, count(), edges.keys(), edges.values(), speed_categories))
             
-            if speed_category:
-                cat_attvalue = SubElement(edge_attvalues, "attvalue")
-                cat_attvalue.set("for", "3")
-                cat_attvalue.set("value", speed_category)
-        
-        # Write to file with pretty printing
-        xml_str = minidom.parseString(tostring(gexf)).toprettyxml(indent="  ")
-        
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(xml_str)
+            f.write(GEXF_FOOTER)
+        os.replace(tmp_path, filepath)
         
         logger.info(f"GEXF file generated: {len(self.graph.nodes)} nodes, {len(self.graph.edges)} edges")
     
@@ -6,15 +6,63 @@ Licensed under CC-BY-NC-SA 4.0
 Dynamic iperf3 server list fetcher from GitHub repository.
 """
 import re
+import hashlib
+import json
+from collections import defaultdict
+from functools import lru_cache
 import logging
 import requests
 import socket
-from typing import List, Dict, Optional
+import threading
+import time
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+
+try:
+    import httpx  # HTTP/2 client, preferred over requests when installed
+except ImportError:
+    httpx = None
 
 logger = logging.getLogger(__name__)
 
 GITHUB_README_URL = "https://raw.githubusercontent.com/R0GGER/public-iperf3-servers/main/README.md"
 
+# The README changes a few times a day at most; keep the parsed, resolved list
+# in memory and on disk (shared across processes) for an hour
+SERVER_LIST_TTL = 3600  # seconds
+SERVER_LIST_CACHE_FILE = Path.home() / ".cache" / "intermap" / "iperf3_servers.json"
+_CACHE = {"servers": None, "ts": 0.0, "etag": None, "digest": None}
+_CACHE_LOCK = threading.Lock()
+
+# Pooled connection to GitHub, so refreshes after the first skip the TCP/TLS
+# handshake. With httpx the connection speaks HTTP/2 (multiplexed, compressed
+# headers), which keeps repeat ETag checks cheap
+_HEADERS = {"User-Agent": "intermap/1.0"}
+if httpx is not None:
+    try:
+        _CLIENT = httpx.Client(http2=True, follow_redirects=True, headers=_HEADERS)
+    except ImportError:  # http2 needs the h2 package (pip install httpx[http2])
+        _CLIENT = httpx.Client(follow_redirects=True, headers=_HEADERS)
+    _HTTP_ERRORS = (httpx.HTTPError,)
+else:
+    _CLIENT = requests.Session()
+    _CLIENT.headers.update(_HEADERS)
+    _CLIENT.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4))
+    _HTTP_ERRORS = (requests.RequestException,)
+
+# iperf3 command line: host after "-c ", optional port after "-p " (either
+# side of -c, via the optional lookahead), matched in one pass
+_CMD_RE = re.compile(r'(?=.*?-p\s+(?P<port>\d+))?.*?-c\s+(?P<host>\S+)')
+
+# README lines we care about, found in one scan of the whole document:
+# continent headers ("### Europe") and server table rows
+# ("| iperf3 -c ... | options | speed | country | site |")
+_README_RE = re.compile(
+    r'^### (?P<continent>[^\n]*)'
+    r'|^\| (?P<command>iperf3 -c [^|\n]*)\|[^|\n]*\|[^|\n]*\|(?P<country>[^|\n]*)(?:\|(?P<site>[^|\n]*))?',
+    re.MULTILINE,
+)
+
 
 def resolve_hostname(hostname: str, timeout: int = 2) -> Optional[str]:
     """
@@ -45,96 +93,188 @@ def resolve_hostname(hostname: str, timeout: int = 2) -> Optional[str]:
         return None
 
 
-def parse_iperf3_command(command: str) -> Optional[Dict[str, any]]:
+@lru_cache(maxsize=4096)
+def parse_iperf3_command(command: str) -> Optional[Tuple[str, int]]:
     """
     Parse iperf3 command string to extract host and port.
     
+    Results are cached, so repeated refreshes of the README skip the regex.
+    
     Examples:
-        "iperf3 -c ping.online.net -p 5200-5209" -> {"host": "ping.online.net", "port": 5200}
-        "iperf3 -c 8.8.8.8" -> {"host": "8.8.8.8", "port": 5201}
+        "iperf3 -c ping.online.net -p 5200-5209" -> ("ping.online.net", 5200)
+        "iperf3 -c 8.8.8.8" -> ("8.8.8.8", 5201)
     
     Args:
         command: iperf3 command string from README
         
     Returns:
-        Dict with host and port, or None if parsing fails
+        (host, port) tuple, or None if parsing fails
     """
-    # Extract hostname/IP after "-c "
-    host_match = re.search(r'-c\s+([^\s]+)', command)
-    if not host_match:
+    # Extract hostname/IP after "-c " and port after "-p " (if present)
+    match = _CMD_RE.match(command)
+    if not match:
         return None
     
-    host = host_match.group(1)
-    
-    # Extract port after "-p " (if present)
-    port_match = re.search(r'-p\s+(\d+)', command)
-    if port_match:
-        port = int(port_match.group(1))
-    else:
-        port = 5201  # Default iperf3 port
-    
-    return {"host": host, "port": port}
+    port = match["port"]
+    return match["host"], int(port) if port else 5201  # Default iperf3 port
 
 
-def fetch_iperf3_servers(timeout: int = 10) -> List[Dict[str, any]]:
+def fetch_iperf3_servers(timeout: int = 10, force_refresh: bool = False) -> List[Dict[str, any]]:
     """
     Fetch all iperf3 servers from the GitHub README and resolve hostnames to IPs.
     
+    Results are cached for SERVER_LIST_TTL, in memory and in
+    SERVER_LIST_CACHE_FILE. After that the README is re-requested
+    conditionally on its ETag, and the cached list is kept on a 304 or
+    if the downloaded README hashes the same as the cached one.
+    
     Args:
         timeout: HTTP request timeout in seconds
+        force_refresh: Ignore the cache and fetch the README again
         
     Returns:
         List of dicts with keys: host (original), ip (resolved), port, location, continent
     """
+    with _CACHE_LOCK:
+        if not force_refresh and _CACHE["servers"] is not None and time.time() - _CACHE["ts"] < SERVER_LIST_TTL:
+            return list(_CACHE["servers"])
+        
+        # Another process may have fetched the list; even a stale copy is
+        # useful as the baseline for a conditional request
+        if _CACHE["servers"] is None:
+            try:
+                cached = json.loads(SERVER_LIST_CACHE_FILE.read_text())
+                _CACHE.update(servers=cached["servers"], etag=cached.get("etag"), digest=cached.get("digest"),
+                              ts=SERVER_LIST_CACHE_FILE.stat().st_mtime)
+                logger.debug(f"Loaded {len(_CACHE['servers'])} iperf3 servers from {SERVER_LIST_CACHE_FILE}")
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+        
+        cached_servers = _CACHE["servers"]
+        if not force_refresh and cached_servers is not None:
+            if time.time() - _CACHE["ts"] < SERVER_LIST_TTL:
+                return list(cached_servers)
+            etag = _CACHE.get("etag")
+        else:
+            etag = None
+        
+        # Even a forced download can skip the parse if the content is the same
+        digest = _CACHE.get("digest") if cached_servers is not None else None
+    
+    # The download and DNS resolution run without the lock, so a slow refresh
+    # doesn't block callers that can be served from the cache
+    servers, etag, digest = _download_iperf3_servers(timeout, etag, digest)
+    
+    with _CACHE_LOCK:
+        if servers is None:
+            # 304 Not Modified or identical content: the cached list is still current
+            logger.info("iperf3 server list unchanged since last fetch")
+            servers = cached_servers
+            if etag != _CACHE.get("etag"):
+                _CACHE["etag"] = etag
+                _save_server_list()
+            else:
+                try:
+                    SERVER_LIST_CACHE_FILE.touch()
+                except OSError:
+                    pass
+            _CACHE["ts"] = time.time()
+        elif servers:
+            # Don't cache failures, so the next call retries
+            _CACHE.update(servers=servers, etag=etag, digest=digest, ts=time.time())
+            _save_server_list()
+        
+        return list(servers)
+
+
+def _save_server_list():
+    """Write the in-memory server list cache to SERVER_LIST_CACHE_FILE."""
+    try:
+        SERVER_LIST_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        SERVER_LIST_CACHE_FILE.write_text(json.dumps({
+            "etag": _CACHE["etag"],
+            "digest": _CACHE["digest"],
+            "servers": _CACHE["servers"],
+        }))
+    except OSError as e:
+        logger.debug(f"Could not save iperf3 server list: {e}")
+
+
+def _download_iperf3_servers(timeout: int, etag: Optional[str] = None,
+                             digest: Optional[str] = None) -> Tuple[Optional[List[Dict[str, any]]], Optional[str], Optional[str]]:
+    """
+    Download and parse the README, resolving each server's hostname.
+    
+    Args:
+        timeout: HTTP request timeout in seconds
+        etag: ETag of the cached copy, sent as If-None-Match
+        digest: Content digest of the cached copy
+        
+    Returns:
+        Tuple of (servers, ETag, digest); servers is None if the README is
+        unchanged since etag or hashes to digest, and empty on failure
+    """
     try:
         logger.info(f"Fetching iperf3 servers from: {GITHUB_README_URL}")
-        response = requests.get(GITHUB_README_URL, timeout=timeout)
+        headers = {"If-None-Match": etag} if etag else {}
+        response = _CLIENT.get(GITHUB_README_URL, timeout=timeout, headers=headers)
+        if response.status_code == 304:
+            return None, etag, digest
         response.raise_for_status()
         
-        content = response.text
+        # Hashing the raw body is far cheaper than parsing it and resolving
+        # every host, so identical content served fresh is detected up front
+        new_digest = hashlib.blake2b(response.content, digest_size=16).hexdigest()
+        if new_digest == digest:
+            return None, response.headers.get("ETag"), digest
+        
+        # The README is UTF-8; decoding the body directly skips the client's
+        # charset detection, which requests runs over the whole body when
+        # the Content-Type header has no charset
+        content = response.content.decode("utf-8", errors="replace")
         servers = []
         current_continent = None
         
-        for line in content.split('\n'):
+        for match in _README_RE.finditer(content):
             # Detect continent headers
-            if line.startswith('### '):
-                current_continent = line.replace('### ', '').strip()
+            continent = match['continent']
+            if continent is not None:
+                current_continent = continent.strip()
                 continue
             
-            # Parse server lines (format: | iperf3 -c ... | options | speed | country | site |)
-            if line.startswith('| iperf3 -c '):
-                parts = [p.strip() for p in line.split('|')]
-                if len(parts) >= 5:
-                    command = parts[1]
-                    country = parts[4] if len(parts) > 4 else "Unknown"
-                    site = parts[5] if len(parts) > 5 else "Unknown"
-                    
-                    # Parse command
-                    server_info = parse_iperf3_command(command)
-                    if server_info:
-                        # Resolve hostname to IP
-                        host = server_info['host']
-                        ip = resolve_hostname(host)
-                        
-                        if ip:
-                            server_info['original_host'] = host  # Keep original for logging
-                            server_info['host'] = ip  # Use IP for traceroute
-                            server_info['location'] = site
-                            server_info['continent'] = current_continent or "Unknown"
-                            server_info['country'] = country
-                            servers.append(server_info)
-                        else:
-                            logger.debug(f"Skipping {host} - DNS resolution failed")
+            # Parse server rows
+            site = match['site']
+            site = site.strip() if site is not None else "Unknown"
+            country = match['country'].strip()
+            
+            # Parse command
+            parsed = parse_iperf3_command(match['command'])
+            if parsed:
+                # Resolve hostname to IP
+                host, port = parsed
+                ip = resolve_hostname(host)
+                
+                if ip:
+                    servers.append({
+                        'host': ip,  # Use IP for traceroute
+                        'port': port,
+                        'original_host': host,  # Keep original for logging
+                        'location': site,
+                        'continent': current_continent or "Unknown",
+                        'country': country,
+                    })
+                else:
+                    logger.debug(f"Skipping {host} - DNS resolution failed")
         
         logger.info(f"Successfully parsed and resolved {len(servers)} iperf3 servers")
-        return servers
+        return servers, response.headers.get("ETag"), new_digest
         
-    except requests.RequestException as e:
+    except _HTTP_ERRORS as e:
         logger.error(f"Failed to fetch iperf3 servers: {e}")
-        return []
+        return [], None, None
     except Exception as e:
         logger.error(f"Error parsing iperf3 servers: {e}")
-        return []
+        return [], None, None
 
 
 def get_server_hosts(max_servers: Optional[int] = None) -> List[str]:
@@ -173,12 +313,9 @@ def get_geographically_diverse_servers(count: int = 20) -> List[Dict[str, any]]:
         return []
     
     # Group by continent
-    by_continent = {}
+    by_continent = defaultdict(list)
     for server in all_servers:
-        continent = server.get('continent', 'Unknown')
-        if continent not in by_continent:
-            by_continent[continent] = []
-        by_continent[continent].append(server)
+        by_continent[server.get('continent', 'Unknown')].append(server)
     
     # Select evenly from each continent
     selected = []
@@ -187,11 +324,12 @@ def get_geographically_diverse_servers(count: int = 20) -> List[Dict[str, any]]:
     for continent, servers in by_continent.items():
         selected.extend(servers[:per_continent])
     
-    # Fill remaining slots if needed
+    # Fill remaining slots if needed (membership by identity, O(1) per server)
     if len(selected) < count:
         remaining = count - len(selected)
+        selected_ids = {id(server) for server in selected}
         for server in all_servers:
-            if server not in selected:
+            if id(server) not in selected_ids:
                 selected.append(server)
                 remaining -= 1
                 if remaining == 0:
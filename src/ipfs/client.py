@@ -7,17 +7,81 @@ Licensed under CC-BY-NC-SA 4.0
 IPFS client for distributed storage and DHT-based P2P peer coordination
 """
 import asyncio
+import io
+import itertools
 import logging
-from typing import Optional, Callable, Dict, Any, List
+import math
+import tarfile
+from collections import OrderedDict
+from typing import Optional, Callable, Dict, Any, List, Tuple
 import json
 from pathlib import Path
 import base64
-import requests
 import time
 
+from src.nat_detection import check_port_open_async
+from src.utils import is_private_ip
+
+try:
+    import aiohttp  # async HTTP client for the IPFS daemon's RPC API
+except ImportError:
+    aiohttp = None
+
+try:
+    from orjson import dumps as json_dumps, loads as json_loads  # bytes in and out, no decode step
+except ImportError:
+    json_loads = json.loads
+    
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')  # compact, like orjson
+
 logger = logging.getLogger(__name__)
 
 
+def _api_url(api_addr: str) -> str:
+    """
+    Convert an IPFS API multiaddr (/ip4/127.0.0.1/tcp/5001) to a base URL.
+    
+    Args:
+        api_addr: Multiaddr, or an http(s) URL which is returned as-is
+        
+    Returns:
+        Base URL of the daemon's HTTP API
+    """
+    if api_addr.startswith(("http://", "https://")):
+        return api_addr.rstrip("/")
+    
+    parts = api_addr.strip("/").split("/")
+    if len(parts) < 4 or parts[2] != "tcp":
+        raise ValueError(f"Unsupported IPFS API address: {api_addr}")
+    
+    protocol, host, _, port = parts[:4]
+    if protocol == "ip6":
+        host = f"[{host}]"
+    return f"http://{host}:{port}"
+
+
+def _tcp_target(addrs: List[str]) -> Optional[Tuple[str, int]]:
+    """Pick the first public /ip4|ip6/<host>/tcp/<port> address from a peer's multiaddrs."""
+    for addr in addrs or ():
+        parts = addr.strip("/").split("/")
+        if len(parts) >= 4 and parts[0] in ("ip4", "ip6") and parts[2] == "tcp" and not is_private_ip(parts[1]):
+            return parts[1], int(parts[3])
+    return None
+
+
+def _extract_tar(archive: bytes, output_path: str):
+    """Unpack a tar archive returned by /api/v0/get into output_path."""
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(output_path, filter="data")
+
+
+def _log_publish_result(task: asyncio.Task):
+    """Done callback for a background IPNS publish: log it if it failed."""
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"IPNS publish of node info failed: {task.exception()}")
+
+
 class IPFSClient:
     """
     Client for interacting with IPFS for distributed storage and P2P coordination.
@@ -28,6 +92,16 @@ class IPFSClient:
     
     # Well-known DHT keys for rendezvous
     RENDEZVOUS_KEY = "QmUNLLsPACCz1vLxQVkXqqLX5R1X345qqfHbsf67hvA3Nn"  # Intermap rendezvous point
+    ANNOUNCE_INTERVAL = 60  # seconds between node announcements (the node's heartbeat)
+    PEER_CACHE_SIZE = 1024  # Parsed peer infos kept by CID
+    PEER_CACHE_TTL = 900  # seconds; CIDs are immutable, this only bounds memory
+    DISCOVERY_TIMEOUT = 30  # seconds, for the whole DHT query + verification
+    DISCOVERY_CONCURRENCY = 8  # Providers verified at once
+    KNOWN_NODE_TTL = 600  # seconds a verified provider is trusted without re-fetching
+    WARMUP_BOOTSTRAP_PEERS = 8  # Bootstrap peers dialed on connect
+    PROVIDER_PROBE_TIMEOUT = 1  # seconds for the TCP connect RTT probe of a provider
+    PROVIDER_PROBE_CONCURRENCY = 32  # Provider RTT probes in flight at once
+    PROVIDER_RTT_TTL = 300  # seconds a provider's measured RTT is reused
     
     def __init__(self, api_addr: str = "/ip4/127.0.0.1/tcp/5001"):
         """
@@ -37,65 +111,136 @@ class IPFSClient:
             api_addr: IPFS API multiaddr (default: local node)
         """
         self.api_addr = api_addr
-        self.client = None
+        self.api_url = _api_url(api_addr)
+        self._http = None  # aiohttp.ClientSession bound to the daemon's API
         self.connected = False
-        self._executor = None
         self._dht_enabled = False
         self._node_info_cid = None  # CID of our published node info
         self._topology_cid = None  # Latest topology CID
+        # CIDs are content hashes, so a fetched peer info never goes stale
+        self._peer_cache: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._peer_fetches: Dict[str, asyncio.Future] = {}  # In-flight cache misses
+        self._known_nodes: Dict[str, Tuple[Dict, float]] = {}  # Provider peer ID -> (node info, expires at)
+        self._warmup_task = None
+        self._publish_task = None  # In-flight IPNS publish of our node info
+        self._provider_rtts: Dict[str, Tuple[float, float]] = {}  # Peer ID -> (RTT, expires at)
         
     async def connect(self):
         """Connect to IPFS node."""
         try:
-            import ipfshttpclient
-            from concurrent.futures import ThreadPoolExecutor
-            
-            # Connect to IPFS daemon
-            self.client = ipfshttpclient.connect(self.api_addr)
+            if aiohttp is None:
+                raise ImportError("aiohttp")
+            
+            # Talk to the daemon's HTTP API directly; many requests can be in
+            # flight on the pooled connector, and idle connections are kept
+            # for longer than the gap between announces/discoveries
+            self._http = aiohttp.ClientSession(
+                base_url=self.api_url,
+                connector=aiohttp.TCPConnector(limit=64, keepalive_timeout=30),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=10),
+            )
             
             # Test connection
-            version = self.client.version()
+            version = await self._request("version")
             logger.info(f"Connected to IPFS at {self.api_addr} (version: {version['Version']})")
             
             # Test DHT availability - just verify we can connect to swarm
             try:
-                peers = self.client.swarm.peers()
+                peers = (await self._request("swarm/peers")).get("Peers") or []
                 self._dht_enabled = True
                 logger.info(f"Connected to IPFS swarm with {len(peers)} peers")
                 logger.info("DHT-based P2P discovery enabled - fully decentralized")
+                
+                # Fill the routing table while the rest of the node starts up,
+                # so the first announce/discovery doesn't pay for a cold DHT
+                self._warmup_task = asyncio.create_task(self._warmup_routing())
             except Exception as e:
                 logger.warning(f"IPFS swarm not available: {e}")
                 logger.warning("Running in standalone mode")
             
-            # Create executor for blocking IPFS calls
-            self._executor = ThreadPoolExecutor(max_workers=4)
-            
             self.connected = True
             
         except ImportError:
-            logger.error("ipfshttpclient not installed. Run: pip install ipfshttpclient")
+            logger.error("aiohttp not installed. Run: pip install aiohttp")
             raise
         except Exception as e:
             logger.error(f"Failed to connect to IPFS: {e}")
             logger.info("Make sure IPFS daemon is running: ipfs daemon")
+            await self._close_http()
             raise
     
     async def disconnect(self):
         """Disconnect from IPFS and cleanup."""
-        # Shutdown executor
-        if self._executor:
-            self._executor.shutdown(wait=False)
+        if self._warmup_task is not None:
+            self._warmup_task.cancel()
+            self._warmup_task = None
+        if self._publish_task is not None:
+            self._publish_task.cancel()
+            self._publish_task = None
         
-        # Close IPFS client
-        if self.client:
-            try:
-                self.client.close()
-            except:
-                pass
+        await self._close_http()
         
         self.connected = False
         logger.info("Disconnected from IPFS")
     
+    async def _close_http(self):
+        """Close the HTTP session, if open."""
+        if self._http is not None:
+            try:
+                await self._http.close()
+            except Exception:
+                pass
+            self._http = None
+    
+    async def _warmup_routing(self):
+        """Dial bootstrap peers and run a throwaway DHT query to populate routing buckets."""
+        try:
+            bootstrap = (await self._request("bootstrap/list", timeout=10)).get("Peers") or []
+            if bootstrap:
+                params = [("arg", addr) for addr in bootstrap[:self.WARMUP_BOOTSTRAP_PEERS]]
+                await self._request("swarm/connect", params=params, timeout=30, decode=False)
+            
+            params = {'arg': self.RENDEZVOUS_KEY, 'num-providers': '3'}
+            await self._request("routing/findprovs", params=params, timeout=self.DISCOVERY_TIMEOUT, decode=False)
+            logger.debug("IPFS routing table warmed up")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"IPFS routing warmup incomplete: {e}")
+    
+    async def _request(self, endpoint: str, params=None, data=None, timeout: float = None, decode: bool = True):
+        """
+        Call an IPFS RPC API endpoint.
+        
+        Args:
+            endpoint: Endpoint path under /api/v0/ (e.g. "cat")
+            params: Query parameters (string values; a list of pairs for repeated keys)
+            data: Request body, e.g. aiohttp.FormData for uploads
+            timeout: Total request timeout in seconds (None = no limit)
+            decode: Parse the response body as JSON
+            
+        Returns:
+            Parsed JSON response, or the raw body if decode is False
+        """
+        request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+        async with self._http.post(f"/api/v0/{endpoint}", params=params, data=data, timeout=request_timeout) as response:
+            body = await response.read()
+            if response.status != 200:
+                raise RuntimeError(f"IPFS {endpoint} returned {response.status}: {body[:200]!r}")
+        return json_loads(body) if decode else body
+    
+    async def _add(self, data, filename: str, pin: bool) -> str:
+        """
+        Upload data (bytes or an open binary file) via /api/v0/add.
+        
+        Returns:
+            IPFS CID of the added data
+        """
+        form = aiohttp.FormData()
+        form.add_field("file", data, filename=filename, content_type="application/octet-stream")
+        result = await self._request("add", params={"pin": "true" if pin else "false"}, data=form)
+        return result["Hash"]
+    
     async def announce_node(self, node_id: str, external_ip: str, api_port: int = 5000, iperf3_port: int = 5201) -> Optional[str]:
         """
         Announce node presence to IPFS network using DHT provider records.
@@ -123,57 +268,50 @@ class IPFSClient:
                 "protocol_version": "intermap-v1"
             }
             
-            # Add to IPFS
-            cid = await self.add_json(node_info)
+            # Add to IPFS, pinned in the same request so it stays available
+            cid = await self.add_json(node_info, pin=True)
             self._node_info_cid = cid
             
-            loop = asyncio.get_event_loop()
-            
-            # Pin it so it stays available
-            await loop.run_in_executor(
-                self._executor,
-                self.client.pin.add,
-                cid
-            )
-            
             # CRITICAL: Advertise as provider for the rendezvous key in DHT
             # This is how other nodes will discover us
-            # Use HTTP API directly - newer IPFS versions use 'routing provide'
-            try:
-                import requests
-                api_url = "http://127.0.0.1:5001/api/v0/routing/provide"
-                params = {'arg': self.RENDEZVOUS_KEY}
-                response = requests.post(api_url, params=params, timeout=30)
-                if response.status_code == 200:
-                    logger.info(f"✓ Announced node to DHT: {cid}")
-                    logger.info(f"  Node ID: {node_id}")
-                    logger.info(f"  External IP: {external_ip}")
-                    logger.info(f"  iperf3: Port {iperf3_port}")
-                    logger.info(f"  DHT Provider for: {self.RENDEZVOUS_KEY}")
-                else:
-                    logger.warning(f"DHT provider advertisement returned: {response.status_code}")
-                    logger.info(f"Announced node to IPFS (no DHT): {cid}")
-            except Exception as e:
-                logger.warning(f"DHT provider advertisement failed: {e}")
-                logger.info(f"Announced node to IPFS (no DHT): {cid}")
-            
             # ALSO: Publish via PubSub for immediate peer discovery
             # This is more reliable than DHT queries
-            try:
-                pubsub_message = {
-                    "type": "node_announcement",
-                    "node_id": node_id,
-                    "external_ip": external_ip,
-                    "api_port": api_port,
-                    "iperf3_port": iperf3_port,
-                    "node_info_cid": cid,
-                    "protocol_version": "intermap-v1",
-                    "timestamp": time.time()
-                }
-                await self.publish("intermap-discovery", pubsub_message)
+            # Both go out at once rather than one after the other
+            pubsub_message = {
+                "type": "node_announcement",
+                "node_id": node_id,
+                "external_ip": external_ip,
+                "api_port": api_port,
+                "iperf3_port": iperf3_port,
+                "node_info_cid": cid,
+                "protocol_version": "intermap-v1",
+                "timestamp": time.time()
+            }
+            provided, published = await asyncio.gather(
+                self._provide(self.RENDEZVOUS_KEY),
+                self.publish("intermap-discovery", pubsub_message),
+                return_exceptions=True
+            )
+            
+            # Point our IPNS name at the node info, so providers found in the
+            # DHT can be resolved to it (see _verify_provider). An IPNS publish
+            # can take most of a minute, so it isn't waited for
+            self._publish_name_in_background(cid)
+            
+            if isinstance(provided, Exception):
+                logger.warning(f"DHT provider advertisement failed: {provided}")
+                logger.info(f"Announced node to IPFS (no DHT): {cid}")
+            else:
+                logger.info(f"✓ Announced node to DHT: {cid}")
+                logger.info(f"  Node ID: {node_id}")
+                logger.info(f"  External IP: {external_ip}")
+                logger.info(f"  iperf3: Port {iperf3_port}")
+                logger.info(f"  DHT Provider for: {self.RENDEZVOUS_KEY}")
+            
+            if isinstance(published, Exception):
+                logger.debug(f"PubSub announcement failed: {published}")
+            else:
                 logger.debug(f"Published node announcement via PubSub")
-            except Exception as e:
-                logger.debug(f"PubSub announcement failed: {e}")
             
             return cid
             
@@ -181,75 +319,227 @@ class IPFSClient:
             logger.warning(f"Failed to announce node: {e}")
             return None
     
+    async def _provide(self, *keys: str):
+        """
+        Advertise this node in the DHT as a provider of keys, in one request.
+        
+        Args:
+            keys: CIDs to provide
+        """
+        # Use HTTP API directly - newer IPFS versions use 'routing provide'
+        await self._request("routing/provide", params=[("arg", key) for key in keys], timeout=30, decode=False)
+    
+    def _publish_name_in_background(self, cid: str):
+        """
+        Start publishing cid under our IPNS name without waiting for it.
+        
+        A publish still running from the previous announce is cancelled, since
+        its node info has been superseded.
+        
+        Args:
+            cid: CID of our node info
+        """
+        if self._publish_task is not None:
+            self._publish_task.cancel()
+        self._publish_task = asyncio.create_task(self._publish_name(cid))
+        self._publish_task.add_done_callback(_log_publish_result)
+    
+    async def _publish_name(self, cid: str):
+        """
+        Publish cid under this node's IPNS name (its peer ID).
+        
+        The record's TTL matches ANNOUNCE_INTERVAL, since that is how often it
+        is replaced; it stays valid for KNOWN_NODE_TTL in case announces stop.
+        
+        Args:
+            cid: CID of our node info
+        """
+        params = {
+            "arg": f"/ipfs/{cid}",
+            "key": "self",
+            "ttl": f"{self.ANNOUNCE_INTERVAL}s",
+            "lifetime": f"{self.KNOWN_NODE_TTL}s",
+            "allow-offline": "true",
+        }
+        await self._request("name/publish", params=params, timeout=self.ANNOUNCE_INTERVAL)
+    
+    async def publish(self, topic: str, message: Dict):
+        """
+        Publish a message to an IPFS PubSub topic.
+        
+        Args:
+            topic: PubSub topic name
+            message: Dictionary to send as JSON
+        """
+        if not self.connected:
+            raise RuntimeError("Not connected to IPFS")
+        
+        # The RPC API takes topics multibase-encoded (base64url, "u" prefix)
+        encoded_topic = "u" + base64.urlsafe_b64encode(topic.encode()).decode().rstrip("=")
+        form = aiohttp.FormData()
+        form.add_field("file", json_dumps(message), filename="message", content_type="application/octet-stream")
+        await self._request("pubsub/pub", params={"arg": encoded_topic}, data=form, decode=False)
+    
     async def discover_peers(self) -> List[Dict]:
         """
         Discover peer nodes by querying DHT for providers of the rendezvous key.
         Fetches and verifies node_info from each provider to ensure they're real Intermap nodes.
         
+        New providers are RTT-probed as they arrive from the DHT and verified
+        nearest-first by DISCOVERY_CONCURRENCY workers.
+        
         Returns:
             List of verified peer node info dictionaries with external_ip, node_id, etc.
         """
         if not self.connected or not self._dht_enabled:
             return []
         
-        try:
-            peers = []
-            loop = asyncio.get_event_loop()
-            provider_cids = []
-            
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.DISCOVERY_TIMEOUT
+        probe_slots = asyncio.Semaphore(self.PROVIDER_PROBE_CONCURRENCY)
+        queue = asyncio.PriorityQueue()  # (RTT, arrival order, peer ID)
+        arrival = itertools.count()
+        probes = []
+        seen = set()
+        
+        # Providers verified in an earlier round are reused as-is; only new
+        # (or expired) ones are resolved and fetched
+        now = time.monotonic()
+        self._known_nodes = {peer_id: known for peer_id, known in self._known_nodes.items() if known[1] > now}
+        peers = []
+        
+        async def _stream_providers():
             # Query DHT for providers of the rendezvous key
             # These SHOULD be Intermap nodes that announced themselves
-            try:
-                # Use newer routing findprovs API
-                import requests
-                api_url = "http://127.0.0.1:5001/api/v0/routing/findprovs"
-                params = {'arg': self.RENDEZVOUS_KEY, 'num-providers': 50}
-                response = requests.post(api_url, params=params, timeout=30, stream=True)
+            params = {'arg': self.RENDEZVOUS_KEY, 'num-providers': '50'}
+            async with self._http.post("/api/v0/routing/findprovs", params=params) as response:
+                if response.status != 200:
+                    logger.debug(f"DHT findprovs returned: {response.status}")
+                    return
                 
-                if response.status_code == 200:
-                    # Parse NDJSON responses to get provider CIDs
-                    for line in response.iter_lines():
-                        if line:
-                            try:
-                                result = json.loads(line)
-                                if result.get('Type') == 4:  # Provider response
-                                    peer_id = result.get('Responses', [{}])[0].get('ID')
-                                    if peer_id:
-                                        # Try to find what CID this provider is providing
-                                        # Providers advertise content, we need to fetch their node_info
-                                        provider_cids.append(peer_id)
-                            except:
-                                pass
-                    
-                    logger.debug(f"DHT query found {len(provider_cids)} potential providers")
+                # Start probing each provider as its NDJSON line arrives,
+                # while the DHT query is still running. The stream is read in
+                # whatever chunks arrive and split here, not line by line
+                buffer = b""
+                async for chunk in response.content.iter_any():
+                    *lines, buffer = (buffer + chunk).split(b"\n")
+                    for line in lines:
+                        _handle_provider_line(line)
+                _handle_provider_line(buffer)
+        
+        def _handle_provider_line(line: bytes):
+            if not line.strip():
+                return
+            try:
+                result = json_loads(line)
+            except ValueError:
+                return
+            if result.get('Type') != 4:  # Provider response
+                return
+            provider = (result.get('Responses') or [{}])[0]
+            peer_id = provider.get('ID')
+            if peer_id and peer_id not in seen:
+                seen.add(peer_id)
+                known = self._known_nodes.get(peer_id)
+                if known is not None:
+                    peers.append(known[0])
                 else:
-                    logger.debug(f"DHT findprovs returned: {response.status_code}")
-                        
+                    probes.append(asyncio.create_task(_probe(peer_id, provider.get('Addrs'))))
+        
+        async def _probe(peer_id: str, addrs: List[str]):
+            async with probe_slots:
+                rtt = await self._probe_provider_rtt(peer_id, addrs)
+            queue.put_nowait((rtt, next(arrival), peer_id))
+        
+        async def _verifier():
+            # Always takes the nearest provider probed so far
+            while True:
+                _, _, peer_id = await queue.get()
+                if peer_id is None:
+                    return
+                peer_info = await self._verify_provider(peer_id)
+                if peer_info:
+                    peers.append(peer_info)
+        
+        async def _drain():
+            await asyncio.gather(*probes)
+            for _ in verifiers:
+                queue.put_nowait((math.inf, next(arrival), None))
+            await asyncio.gather(*verifiers)
+        
+        verifiers = [asyncio.create_task(_verifier()) for _ in range(self.DISCOVERY_CONCURRENCY)]
+        try:
+            try:
+                await asyncio.wait_for(_stream_providers(), timeout=self.DISCOVERY_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.debug("DHT findprovs hit the discovery deadline")
             except Exception as e:
                 logger.debug(f"DHT findprovs error: {e}")
             
-            # Now try to fetch node_info from DHT using common pattern
-            # Intermap nodes publish node_info as: QmXXXXXX (their node_info CID)
-            # We'll try to find these by querying the DHT for "intermap-node-*" pattern
-            # Alternative: Use IPNS or a known naming convention
-            
-            # For now, just query swarm peers and see who responds to our protocol
-            # This is a simpler approach - check connected peers
-            def _get_swarm_peers():
-                return self.client.swarm.peers()
-            
-            swarm_peers = await loop.run_in_executor(self._executor, _get_swarm_peers)
-            logger.debug(f"Connected to {len(swarm_peers)} IPFS swarm peers (not all are Intermap nodes)")
+            logger.debug(f"DHT query found {len(seen)} potential providers ({len(peers)} already known)")
             
-            # Return verified peers only (TODO: implement actual node_info fetching)
-            # For now, this prevents false positives by returning empty until we can verify
-            logger.info(f"Verified {len(peers)} actual Intermap nodes (need node_info exchange protocol)")
-            
-            return peers
+            # Whatever is still probing or verifying at the deadline is dropped
+            await asyncio.wait_for(_drain(), timeout=max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            logger.debug("Provider verification hit the discovery deadline")
+        finally:
+            for task in (*probes, *verifiers):
+                task.cancel()
+        
+        logger.info(f"Verified {len(peers)} actual Intermap nodes")
+        return peers
+    
+    async def _verify_provider(self, peer_id: str) -> Optional[Dict]:
+        """
+        Fetch a DHT provider's node info, via the IPNS name of its peer ID.
+        
+        Args:
+            peer_id: Peer ID of a rendezvous key provider
             
+        Returns:
+            Node info if the provider is an Intermap node, else None
+        """
+        try:
+            resolved = await self._request("name/resolve", params={"arg": f"/ipns/{peer_id}"}, timeout=10)
         except Exception as e:
-            logger.debug(f"Peer discovery error: {e}")
-            return []
+            logger.debug(f"Could not resolve node info for provider {peer_id}: {e}")
+            return None
+        
+        cid = resolved.get("Path", "").removeprefix("/ipfs/")
+        peer_info = await self.fetch_peer_info(cid) if cid else None
+        
+        if isinstance(peer_info, dict) and peer_info.get("protocol_version") == "intermap-v1":
+            self._known_nodes[peer_id] = (peer_info, time.monotonic() + self.KNOWN_NODE_TTL)
+            return peer_info
+        return None
+    
+    async def _probe_provider_rtt(self, peer_id: str, addrs: List[str] = None) -> float:
+        """
+        Measure a provider's RTT with a TCP connect to its swarm address.
+        
+        Results are cached for PROVIDER_RTT_TTL, so a known provider costs no
+        network round trip.
+        
+        Args:
+            peer_id: Peer ID of the provider
+            addrs: The provider's multiaddrs from findprovs
+            
+        Returns:
+            RTT in seconds, or math.inf if unreachable or without a public TCP address
+        """
+        cached = self._provider_rtts.get(peer_id)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        
+        rtt = math.inf
+        target = _tcp_target(addrs)
+        if target is not None:
+            start = time.monotonic()
+            if await check_port_open_async(*target, timeout=self.PROVIDER_PROBE_TIMEOUT, ttl=0):
+                rtt = time.monotonic() - start
+        
+        self._provider_rtts[peer_id] = (rtt, time.monotonic() + self.PROVIDER_RTT_TTL)
+        return rtt
     
     async def publish_topology(self, topology_path: str) -> Optional[str]:
         """
@@ -265,17 +555,10 @@ class IPFSClient:
             return None
         
         try:
-            cid = await self.add_file(topology_path)
+            # Add and pin topology in one request
+            cid = await self.add_file(topology_path, pin=True)
             self._topology_cid = cid
             
-            # Pin topology
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                self._executor,
-                self.client.pin.add,
-                cid
-            )
-            
             logger.info(f"Published topology to IPFS: {cid}")
             return cid
             
@@ -287,25 +570,69 @@ class IPFSClient:
         """
         Fetch peer node info from IPFS by CID.
         
+        Results are cached by CID for PEER_CACHE_TTL (least recently used
+        evicted first), and concurrent requests for the same CID share one fetch.
+        
         Args:
             cid: Content ID of peer info
             
         Returns:
             Peer info dictionary or None
         """
+        cached = self._peer_cache.get(cid)
+        if cached is not None:
+            if time.monotonic() - cached[0] < self.PEER_CACHE_TTL:
+                self._peer_cache.move_to_end(cid)
+                return cached[1]
+            del self._peer_cache[cid]
+        
+        fetch = self._peer_fetches.get(cid)
+        if fetch is None:
+            fetch = self._peer_fetches[cid] = asyncio.ensure_future(self._fetch_peer_info(cid))
+            fetch.add_done_callback(lambda _: self._peer_fetches.pop(cid, None))
+        return await asyncio.shield(fetch)
+    
+    async def _fetch_peer_info(self, cid: str) -> Optional[Dict]:
+        """Fetch and cache peer node info on a cache miss."""
         try:
             content = await self.cat_file(cid)
-            return json.loads(content.decode('utf-8'))
+            peer_info = json_loads(content)
+            
+            self._peer_cache[cid] = (time.monotonic(), peer_info)
+            if len(self._peer_cache) > self.PEER_CACHE_SIZE:
+                self._peer_cache.popitem(last=False)
+            return peer_info
         except Exception as e:
             logger.debug(f"Failed to fetch peer info {cid}: {e}")
             return None
     
-    async def add_json(self, data: Dict) -> str:
+    async def fetch_peer_infos(self, cids: List[str], max_concurrent: int = 8) -> List[Dict]:
+        """
+        Fetch many peer node infos concurrently.
+        
+        Args:
+            cids: Content IDs of peer infos
+            max_concurrent: Maximum fetches in flight against the IPFS daemon
+            
+        Returns:
+            Peer info dictionaries that could be fetched and parsed
+        """
+        semaphore = asyncio.Semaphore(max_concurrent)
+        
+        async def _fetch(cid: str) -> Optional[Dict]:
+            async with semaphore:
+                return await self.fetch_peer_info(cid)
+        
+        results = await asyncio.gather(*(_fetch(cid) for cid in cids), return_exceptions=True)
+        return [result for result in results if isinstance(result, dict)]
+    
+    async def add_json(self, data: Dict, pin: bool = True) -> str:
         """
         Add JSON data to IPFS.
         
         Args:
             data: Dictionary to serialize and add
+            pin: Pin the data as part of the add request
             
         Returns:
             IPFS CID of the added data
@@ -314,32 +641,25 @@ class IPFSClient:
             raise RuntimeError("Not connected to IPFS")
         
         try:
-            import tempfile
-            import os
+            payload = json_dumps(data)
             
-            # Write JSON to temp file
-            with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json') as f:
-                json.dump(data, f)
-                temp_path = f.name
+            # Add straight from memory
+            cid = await self._add(payload, "node_info.json", pin)
+            
+            logger.debug(f"Added JSON to IPFS: {len(payload)} bytes -> {cid}")
+            return cid
             
-            try:
-                # Add to IPFS
-                cid = await self.add_file(temp_path)
-                return cid
-            finally:
-                # Cleanup temp file
-                os.unlink(temp_path)
-                
         except Exception as e:
             logger.error(f"Failed to add JSON to IPFS: {e}")
             raise
     
-    async def add_file(self, file_path: str) -> str:
+    async def add_file(self, file_path: str, pin: bool = True) -> str:
         """
         Add a file to IPFS.
         
         Args:
             file_path: Path to file to add
+            pin: Pin the file as part of the add request
             
         Returns:
             IPFS CID (Content Identifier) of the added file
@@ -348,16 +668,10 @@ class IPFSClient:
             raise RuntimeError("Not connected to IPFS")
         
         try:
-            loop = asyncio.get_event_loop()
-            
-            # Add file in executor (blocking call)
-            result = await loop.run_in_executor(
-                self._executor,
-                self.client.add,
-                file_path
-            )
-            
-            cid = result['Hash']
+            # Stream the file to the daemon (aiohttp reads it off the event loop)
+            with open(file_path, "rb") as f:
+                cid = await self._add(f, Path(file_path).name, pin)
+
             logger.info(f"Added file to IPFS: {file_path} -> {cid}")
             return cid
             
@@ -377,15 +691,9 @@ class IPFSClient:
             raise RuntimeError("Not connected to IPFS")
         
         try:
-            loop = asyncio.get_event_loop()
-            
-            # Get file in executor (blocking call)
-            await loop.run_in_executor(
-                self._executor,
-                self.client.get,
-                cid,
-                target=output_path
-            )
+            # /get returns a tar archive of the object; unpack it off the event loop
+            archive = await self._request("get", params={"arg": cid}, decode=False)
+            await asyncio.to_thread(_extract_tar, archive, output_path)
             
             logger.info(f"Retrieved file from IPFS: {cid} -> {output_path}")
             
@@ -407,14 +715,7 @@ class IPFSClient:
             raise RuntimeError("Not connected to IPFS")
         
         try:
-            loop = asyncio.get_event_loop()
-            
-            # Cat file in executor (blocking call)
-            contents = await loop.run_in_executor(
-                self._executor,
-                self.client.cat,
-                cid
-            )
+            contents = await self._request("cat", params={"arg": cid}, decode=False)
             
             logger.debug(f"Read file from IPFS: {cid} ({len(contents)} bytes)")
             return contents
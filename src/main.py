@@ -7,16 +7,26 @@ Licensed under CC-BY-NC-SA 4.0
 Main entry point for running a topology mapper node
 """
 import asyncio
+import atexit
 import logging
 import argparse
+import queue
+import signal
 import sys
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 
+try:
+    import uvloop  # libuv event loop: cheaper socket I/O for the IPFS/DHT fan-out
+except ImportError:
+    uvloop = None
+
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from src.node.node import TopologyNode
 from src.ipfs.client import IPFSClient
+from src.nat_detection import invalidate_nat_cache
 
 
 def setup_logging(verbose: bool = False):
@@ -27,14 +37,24 @@ def setup_logging(verbose: bool = False):
     import os
     log_path = '/tmp/topology_node.log' if os.path.exists('/tmp') else 'topology_node.log'
     
-    logging.basicConfig(
-        level=level,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler(),
-            logging.FileHandler(log_path)
-        ]
-    )
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [
+        logging.StreamHandler(),
+        logging.FileHandler(log_path)
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    # Loggers only enqueue records; a background thread does the console and
+    # file writes, so logging never blocks the event loop on I/O
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))  # listener's handlers add the prefix
+    logging.basicConfig(level=level, handlers=[queue_handler])
 
 
 async def main():
@@ -63,6 +83,10 @@ async def main():
     logger = logging.getLogger(__name__)
     logger.info("Starting Distributed Topology Mapper Node")
     
+    # SIGHUP (e.g. after a network change) forces fresh local/external IP detection
+    if hasattr(signal, "SIGHUP"):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, invalidate_nat_cache)
+    
     # Create and start node
     node = TopologyNode(node_id=args.node_id)
     
@@ -83,4 +107,7 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
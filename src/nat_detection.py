@@ -6,65 +6,239 @@ Licensed under CC-BY-NC-SA 4.0
 """
 NAT detection and firewall handling utilities
 """
+import asyncio
 import socket
 import logging
-from typing import Optional, Tuple
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from functools import cache
+from typing import Dict, Optional, Tuple
 import requests
 
+try:
+    import aiohttp  # non-blocking probes for async callers
+except ImportError:
+    aiohttp = None
+
 logger = logging.getLogger(__name__)
 
+# Services that echo the caller's public IP; all are queried at once and the
+# first good answer wins
+EXTERNAL_IP_SERVICES = (
+    "https://api.ipify.org",
+    "https://ifconfig.me/ip",
+    "https://icanhazip.com",
+)
+
+# The external IP changes on the order of hours, so NAT detection results are
+# cached per local IP for the life of the process (a host that moved networks
+# while stopped probes again on start); port reachability is cached for less time
+NAT_CACHE_TTL = 3600  # seconds
+PORT_CHECK_TTL = 300  # seconds
+PORT_CACHE_SIZE = 1024  # (host, port) results kept; the oldest are dropped first
+_nat_cache: Dict[str, Tuple[float, Tuple[bool, Optional[str], Optional[str]]]] = {}
+_port_cache: Dict[Tuple[str, int], Tuple[float, bool]] = {}
+_local_ip_cache: Optional[str] = None
+_cache_lock = threading.Lock()
 
-def detect_nat() -> Tuple[bool, Optional[str], Optional[str]]:
+
+def _get_local_ip(refresh: bool = False) -> str:
     """
-    Detect if behind NAT by comparing local and external IPs.
+    Get the local IP of the interface holding the default route.
     
-    Returns:
-        (is_behind_nat, local_ip, external_ip)
+    The lookup (a UDP socket "connected" to 8.8.8.8) is done once and cached
+    until refresh is set or invalidate_nat_cache() is called.
     """
-    try:
-        # Get local IP
+    global _local_ip_cache
+    
+    if _local_ip_cache is None or refresh:
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        local_ip = s.getsockname()[0]
-        s.close()
+        try:
+            s.connect(("8.8.8.8", 80))
+            _local_ip_cache = s.getsockname()[0]
+        finally:
+            s.close()
+    return _local_ip_cache
+
+
+def invalidate_nat_cache():
+    """Forget the cached local IP, NAT detection and port check results (e.g. on SIGHUP)."""
+    global _local_ip_cache
+    
+    with _cache_lock:
+        _local_ip_cache = None
+        _nat_cache.clear()
+        _port_cache.clear()
+    logger.info("NAT detection cache cleared")
+
+
+def _nat_result(local_ip: str, external_ip: Optional[str]) -> Tuple[bool, Optional[str], Optional[str]]:
+    """Compare local and external IPs and log the outcome."""
+    if not external_ip:
+        logger.warning("Could not detect external IP")
+        return False, local_ip, None
+    
+    is_behind_nat = (local_ip != external_ip)
+    
+    if is_behind_nat:
+        logger.info(f"Behind NAT: local={local_ip}, external={external_ip}")
+    else:
+        logger.info(f"Direct connection: {external_ip}")
+    
+    return is_behind_nat, local_ip, external_ip
+
+
+def _cached_nat(local_ip: str, ttl: float) -> Optional[Tuple[bool, Optional[str], Optional[str]]]:
+    """Get a NAT detection result for local_ip if it is younger than ttl."""
+    with _cache_lock:
+        entry = _nat_cache.get(local_ip)
+    
+    if entry is not None and time.time() - entry[0] < ttl:
+        logger.debug(f"Using cached NAT detection for {local_ip}: external={entry[1][2]}")
+        return entry[1]
+    return None
+
+
+def _store_nat(result: Tuple[bool, Optional[str], Optional[str]]):
+    """Cache a successful NAT detection result."""
+    _, local_ip, external_ip = result
+    if not external_ip:
+        return  # Don't cache failures, so the next call retries
+    
+    with _cache_lock:
+        _nat_cache[local_ip] = (time.time(), result)
+
+
+def _query_ip_service(service: str, timeout: int) -> Optional[str]:
+    """Ask one service for our external IP."""
+    response = requests.get(service, timeout=timeout)
+    if response.status_code == 200:
+        return response.text.strip() or None
+    return None
+
+
+def get_external_ip(timeout: int = 5) -> Optional[str]:
+    """
+    Detect the external IP, racing all EXTERNAL_IP_SERVICES.
+    
+    Args:
+        timeout: Per-service timeout in seconds
         
-        # Get external IP
-        external_ip = None
-        services = [
-            "https://api.ipify.org",
-            "https://ifconfig.me/ip",
-            "https://icanhazip.com"
-        ]
+    Returns:
+        External IP from the fastest service that answered, or None
+    """
+    executor = ThreadPoolExecutor(max_workers=len(EXTERNAL_IP_SERVICES))
+    try:
+        pending = {executor.submit(_query_ip_service, service, timeout) for service in EXTERNAL_IP_SERVICES}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and future.result():
+                    return future.result()
+        return None
+    finally:
+        # Don't wait for the slower services
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def get_external_ip_async(timeout: int = 5) -> Optional[str]:
+    """
+    Async get_external_ip: races all EXTERNAL_IP_SERVICES without blocking the event loop.
+    
+    Args:
+        timeout: Per-service timeout in seconds
         
-        for service in services:
-            try:
-                response = requests.get(service, timeout=5)
-                if response.status_code == 200:
-                    external_ip = response.text.strip()
-                    break
-            except:
-                continue
+    Returns:
+        External IP from the fastest service that answered, or None
+    """
+    if aiohttp is None:
+        return await asyncio.get_running_loop().run_in_executor(None, get_external_ip, timeout)
+    
+    connector = aiohttp.TCPConnector(limit_per_host=32, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        async def _query(service: str) -> Optional[str]:
+            async with session.get(service) as response:
+                if response.status == 200:
+                    return (await response.text()).strip() or None
+                return None
         
-        if not external_ip:
-            logger.warning("Could not detect external IP")
-            return False, local_ip, None
+        pending = {asyncio.ensure_future(_query(service)) for service in EXTERNAL_IP_SERVICES}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result():
+                        return task.result()
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def detect_nat(ttl: float = NAT_CACHE_TTL, force: bool = False) -> Tuple[bool, Optional[str], Optional[str]]:
+    """
+    Detect if behind NAT by comparing local and external IPs.
+    
+    Args:
+        ttl: Reuse a cached result for this local IP if younger than ttl seconds
+        force: Ignore the cache (including the local IP) and probe again
+    
+    Returns:
+        (is_behind_nat, local_ip, external_ip)
+    """
+    try:
+        local_ip = _get_local_ip(refresh=force)
+        cached = None if force else _cached_nat(local_ip, ttl)
+        if cached is not None:
+            return cached
         
-        # Compare IPs
-        is_behind_nat = (local_ip != external_ip)
+        result = _nat_result(local_ip, get_external_ip())
+        _store_nat(result)
+        return result
         
-        if is_behind_nat:
-            logger.info(f"Behind NAT: local={local_ip}, external={external_ip}")
-        else:
-            logger.info(f"Direct connection: {external_ip}")
+    except Exception as e:
+        logger.error(f"Error detecting NAT: {e}")
+        return False, None, None
+
+
+async def detect_nat_async(ttl: float = NAT_CACHE_TTL, force: bool = False) -> Tuple[bool, Optional[str], Optional[str]]:
+    """
+    Async detect_nat, for use inside the event loop.
+    
+    Args:
+        ttl: Reuse a cached result for this local IP if younger than ttl seconds
+        force: Ignore the cache (including the local IP) and probe again
+    
+    Returns:
+        (is_behind_nat, local_ip, external_ip)
+    """
+    try:
+        local_ip = _get_local_ip(refresh=force)
+        cached = None if force else _cached_nat(local_ip, ttl)
+        if cached is not None:
+            return cached
         
-        return is_behind_nat, local_ip, external_ip
+        result = _nat_result(local_ip, await get_external_ip_async())
+        _store_nat(result)
+        return result
         
     except Exception as e:
         logger.error(f"Error detecting NAT: {e}")
         return False, None, None
 
 
-def check_port_open(host: str, port: int, timeout: int = 5) -> bool:
+def _store_port(key: Tuple[str, int], is_open: bool):
+    """Cache a port check result, dropping the oldest once PORT_CACHE_SIZE is reached."""
+    with _cache_lock:
+        _port_cache.pop(key, None)  # Re-insert at the end to keep insertion order = age
+        while len(_port_cache) >= PORT_CACHE_SIZE:
+            del _port_cache[next(iter(_port_cache))]
+        _port_cache[key] = (time.time(), is_open)
+
+
+def check_port_open(host: str, port: int, timeout: int = 5, ttl: float = PORT_CHECK_TTL) -> bool:
     """
     Check if a port is open/reachable.
     
@@ -72,25 +246,72 @@ def check_port_open(host: str, port: int, timeout: int = 5) -> bool:
         host: Host to check
         port: Port number
         timeout: Timeout in seconds
+        ttl: Reuse a previous result for (host, port) if younger than ttl seconds (0 = always check, and don't cache)
         
     Returns:
         True if port is open/reachable
     """
+    key = (host, port)
+    with _cache_lock:
+        entry = _port_cache.get(key)
+    if ttl > 0 and entry is not None and time.time() - entry[0] < ttl:
+        return entry[1]
+    
     try:
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(timeout)
         result = sock.connect_ex((host, port))
         sock.close()
-        return result == 0
+        is_open = result == 0
     except Exception as e:
         logger.debug(f"Port check failed for {host}:{port} - {e}")
-        return False
+        is_open = False
+    
+    if ttl > 0:
+        _store_port(key, is_open)
+    return is_open
 
 
+async def check_port_open_async(host: str, port: int, timeout: int = 5, ttl: float = PORT_CHECK_TTL) -> bool:
+    """
+    Async check_port_open, without blocking the event loop.
+    
+    Args:
+        host: Host to check
+        port: Port number
+        timeout: Timeout in seconds
+        ttl: Reuse a previous result for (host, port) if younger than ttl seconds (0 = always check, and don't cache)
+        
+    Returns:
+        True if port is open/reachable
+    """
+    key = (host, port)
+    with _cache_lock:
+        entry = _port_cache.get(key)
+    if ttl > 0 and entry is not None and time.time() - entry[0] < ttl:
+        return entry[1]
+    
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=timeout)
+        writer.close()
+        is_open = True
+    except Exception as e:
+        logger.debug(f"Port check failed for {host}:{port} - {e}")
+        is_open = False
+    
+    if ttl > 0:
+        _store_port(key, is_open)
+    return is_open
+
+
+@cache
 def check_traceroute_capability() -> bool:
     """
     Check if traceroute is available and working.
     
+    This is a property of the machine, so the probe runs once per process;
+    check_traceroute_capability.cache_clear() forces a re-check.
+    
     Returns:
         True if traceroute commands work
     """
@@ -107,7 +328,8 @@ def check_traceroute_capability() -> bool:
         
         result = subprocess.run(
             cmd,
-            capture_output=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
             timeout=10
         )
         
@@ -163,10 +385,13 @@ Note: May need to run with sudo for traceroute.
         return "Platform-specific firewall suggestions not available."
 
 
-def test_connectivity() -> dict:
+async def test_connectivity_async() -> dict:
     """
     Test network connectivity and capabilities.
     
+    The independent checks run concurrently, so this takes as long as the
+    slowest one rather than all of them in turn.
+    
     Returns:
         Dictionary with connectivity test results
     """
@@ -180,15 +405,33 @@ def test_connectivity() -> dict:
         "suggestions": []
     }
     
+    async def _check_internet() -> bool:
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection("8.8.8.8", 53), timeout=5)
+            writer.close()
+            return True
+        except Exception:
+            return False
+    
+    async def _check_nat_and_port():
+        # The iperf3 port check needs the external IP
+        nat = await detect_nat_async()
+        external_ip = nat[2]
+        port_open = await check_port_open_async(external_ip, 5201, timeout=2) if external_ip else False
+        return nat, port_open
+    
+    internet, ((is_nat, local_ip, external_ip), port_open), traceroute = await asyncio.gather(
+        _check_internet(),
+        _check_nat_and_port(),
+        asyncio.to_thread(check_traceroute_capability)
+    )
+    
     # Test internet connectivity
-    try:
-        socket.create_connection(("8.8.8.8", 53), timeout=5)
-        results["internet"] = True
-    except:
+    results["internet"] = internet
+    if not internet:
         results["suggestions"].append("No internet connectivity detected")
     
     # Detect NAT
-    is_nat, local_ip, external_ip = detect_nat()
     results["nat"] = is_nat
     results["local_ip"] = local_ip
     results["external_ip"] = external_ip
@@ -200,7 +443,7 @@ def test_connectivity() -> dict:
         )
     
     # Check traceroute
-    results["traceroute"] = check_traceroute_capability()
+    results["traceroute"] = traceroute
     if not results["traceroute"]:
         results["suggestions"].append(
             "Traceroute not working. May need elevated privileges (sudo/administrator). "
@@ -209,7 +452,7 @@ def test_connectivity() -> dict:
     
     # Check iperf3 port
     if results["external_ip"]:
-        results["iperf3_port"] = check_port_open(results["external_ip"], 5201, timeout=2)
+        results["iperf3_port"] = port_open
         if not results["iperf3_port"]:
             results["suggestions"].append(
                 "iperf3 port (5201) not reachable. Bandwidth tests to this node may fail. "
@@ -219,6 +462,16 @@ def test_connectivity() -> dict:
     return results
 
 
+def test_connectivity() -> dict:
+    """
+    Test network connectivity and capabilities (sync wrapper around test_connectivity_async).
+    
+    Returns:
+        Dictionary with connectivity test results
+    """
+    return asyncio.run(test_connectivity_async())
+
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     
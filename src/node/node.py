@@ -14,7 +14,6 @@ from pathlib import Path
 import json
 import yaml
 import sys
-import requests
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
@@ -23,8 +22,8 @@ from src.ipfs.client import IPFSClient
 from src.traceroute.tracer import Traceroute, detect_local_subnet, get_live_subnet_hosts
 from src.graph.gexf_generator import NetworkGraph, GEXFGenerator
 from src.bandwidth.bandwidth_tester import IPerf3Client, SpeedtestClient, BandwidthTestManager
-from src.nat_detection import detect_nat, test_connectivity
-from src.utils import is_private_ip
+from src.nat_detection import detect_nat_async, test_connectivity_async
+from src.utils import is_private_ip, topology_write_lock
 
 logger = logging.getLogger(__name__)
 
@@ -163,33 +162,6 @@ class TopologyNode:
             import uuid
             return f"node-{uuid.uuid4().hex[:12]}"
     
-    def _get_external_ip(self) -> Optional[str]:
-        """Detect external IP address."""
-        try:
-            # Try multiple services for reliability
-            services = [
-                "https://api.ipify.org",
-                "https://ifconfig.me/ip",
-                "https://icanhazip.com"
-            ]
-            
-            for service in services:
-                try:
-                    response = requests.get(service, timeout=5)
-                    if response.status_code == 200:
-                        ip = response.text.strip()
-                        logger.info(f"Detected external IP: {ip}")
-                        return ip
-                except:
-                    continue
-            
-            logger.warning("Failed to detect external IP from all services")
-            return None
-            
-        except Exception as e:
-            logger.error(f"Error detecting external IP: {e}")
-            return None
-    
     async def start(self):
         """Start the node and begin participating in the network."""
         logger.info(f"Starting node {self.node_id}")
@@ -198,7 +170,7 @@ class TopologyNode:
         try:
             # Run connectivity tests
             logger.info("Running network connectivity tests...")
-            connectivity = test_connectivity()
+            connectivity = await test_connectivity_async()
             
             if not connectivity["internet"]:
                 logger.error("No internet connectivity detected!")
@@ -209,7 +181,7 @@ class TopologyNode:
                 logger.info("Try running with: sudo python launch.py (Linux/Mac) or as Administrator (Windows)")
             
             # Detect NAT
-            is_nat, local_ip, external_ip = detect_nat()
+            is_nat, local_ip, external_ip = await detect_nat_async()
             self.external_ip = external_ip
             
             if not self.external_ip:
@@ -238,7 +210,12 @@ class TopologyNode:
             # Initialize bandwidth manager
             bandwidth_config = self.config.get("bandwidth", {}).get("iperf3", {})
             self.bandwidth_manager = BandwidthTestManager(
-                duration=bandwidth_config.get("duration", 10)
+                duration=bandwidth_config.get("duration", 10),
+                parallel_tests=bandwidth_config.get("parallel_tests", 1),
+                pin_cpus=bandwidth_config.get("pin_cpus", False),
+                zero_copy=bandwidth_config.get("zero_copy", True),
+                window=bandwidth_config.get("window"),
+                cport_base=bandwidth_config.get("cport_base")
             )
             
             # Add well-known targets from config (resolve hostnames to IPs)
@@ -486,10 +463,11 @@ class TopologyNode:
         """Periodically announce presence and discover peers via IPFS DHT (P2P)."""
         while self.running:
             try:
-                await asyncio.sleep(60)  # Heartbeat every 60 seconds
+                await asyncio.sleep(IPFSClient.ANNOUNCE_INTERVAL)  # Heartbeat every 60 seconds
                 
                 # Check if external IP changed (mobile devices, satellites, laptops)
-                new_ip = self._get_external_ip()
+                # Always probe here (and refresh the NAT cache for other callers)
+                _, _, new_ip = await detect_nat_async(force=True)
                 if new_ip and new_ip != self.external_ip:
                     logger.warning(f"🚀 MOBILITY DETECTED: External IP changed: {self.external_ip} -> {new_ip}")
                     logger.info(f"Device moved to new location/network - remapping subnet")
@@ -759,7 +737,8 @@ class TopologyNode:
                         
                         result = subprocess.run(
                             cmd,
-                            capture_output=True,
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL,
                             timeout=2
                         )
                         
@@ -1068,10 +1047,10 @@ class TopologyNode:
                 
                 logger.info(f"Found {len(testable_ips)} IPs with iperf3 servers")
                 
-                # Test all targets sequentially with traceroute paths
-                logger.info(f"Starting sequential bandwidth tests to {len(testable_ips)} targets...")
+                # Test all targets with traceroute paths without blocking the event loop
+                logger.info(f"Starting bandwidth tests to {len(testable_ips)} targets...")
                 logger.info("Each test will traceroute first to get full path...")
-                results = self.bandwidth_manager.test_all_targets(
+                results = await self.bandwidth_manager.test_all_targets_async(
                     testable_ips,
                     port=5201,
                     probe_first=False,  # Already probed
@@ -1164,7 +1143,9 @@ class TopologyNode:
             # Save LOCAL topology (includes private IPs) for web UI visualization
             local_gexf_path = output_dir / "topology_latest.gexf"
             local_generator = GEXFGenerator(self.local_graph)
-            local_generator.generate(str(local_gexf_path), "Local Internet Topology (includes private IPs)")
+            # The API server merges traces into the same file
+            with topology_write_lock(output_dir):
+                local_generator.generate(str(local_gexf_path), "Local Internet Topology (includes private IPs)")
             logger.info(f"Saved local topology: {len(self.local_graph.nodes)} nodes (includes private IPs)")
             
             # Save PUBLIC topology (public IPs only) for IPFS sharing
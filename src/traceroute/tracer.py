@@ -284,8 +284,8 @@ class Traceroute:
             
             result = subprocess.run(
                 cmd,
-                capture_output=True,
-                text=True,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
                 timeout=5
             )
             
@@ -648,8 +648,8 @@ def detect_local_subnet() -> Optional[str]:
                 # Fall back to ifconfig
                 result = subprocess.run(
                     ["ifconfig"],
-                    capture_output=True,
-                    text=True,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
                     timeout=5
                 )
                 # Parse ifconfig output (more complex, varies by OS)
@@ -704,7 +704,8 @@ def ping_sweep(subnet: str, timeout: int = 1, max_workers: int = 50) -> Set[str]
                 
                 result = subprocess.run(
                     cmd,
-                    capture_output=True,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
                     timeout=timeout + 1
                 )
                 
@@ -7,10 +7,17 @@ Licensed under CC-BY-NC-SA 4.0
 Utility functions and helpers
 """
 import logging
+from contextlib import contextmanager
+from pathlib import Path
 from typing import Optional, List
 import socket
 import ipaddress
 
+try:
+    import fcntl  # POSIX only; serializes topology writes across processes
+except ImportError:
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -145,3 +152,28 @@ def format_rtt(rtt_ms: float) -> str:
         Formatted string (e.g., "1.23 ms")
     """
     return f"{rtt_ms:.2f} ms"
+
+
+@contextmanager
+def topology_write_lock(output_dir: Path):
+    """
+    Exclusive lock on the topology files in output_dir across processes.
+    
+    Held by the node while it writes topology_latest.gexf and by every API
+    worker while it merges a trace into it, so their writes never interleave.
+    A no-op where fcntl is unavailable.
+    
+    Args:
+        output_dir: Directory holding the topology files
+    """
+    if fcntl is None:
+        yield
+        return
+    
+    output_dir.mkdir(exist_ok=True)
+    with open(output_dir / ".topology.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,117 @@
+"""
+Intermap - Distributed P2P Internet Topology Mapper
+Copyright (c) 2025 Jay Wenden
+Licensed under CC-BY-NC-SA 4.0
+"""
+"""
+Unit tests for topology file serving in the API server
+"""
+import gzip
+import os
+import pytest
+
+pytest.importorskip("flask")
+from src import api_server
+from src.api_server import app, _send_topology, _gzip_sidecar, _write_gzip_sidecar, _refresh_topology_index, _replace_with_link
+
+GEXF = b'<?xml version="1.0" encoding="utf-8"?>\n<gexf xmlns="http://gexf.net/1.3" version="1.3"/>\n' * 50
+
+
+@pytest.fixture
+def topology(tmp_path):
+    path = tmp_path / "topology_20250101_000000.gexf"
+    path.write_bytes(GEXF)
+    return path
+
+
+def _get(path, **headers):
+    with app.test_request_context(headers=headers):
+        response = _send_topology(path)
+        response.direct_passthrough = False
+        return response
+
+
+def test_send_topology_plain(topology):
+    """Test clients without gzip get the file as-is, and nothing is compressed."""
+    response = _get(topology)
+
+    assert response.status_code == 200
+    assert response.get_data() == GEXF
+    assert "Content-Encoding" not in response.headers
+    assert "Accept-Encoding" in response.vary
+    assert not _gzip_sidecar(topology).exists()
+
+    response = _get(topology, **{"Accept-Encoding": "gzip;q=0, identity"})
+    assert "Content-Encoding" not in response.headers
+
+
+def test_send_topology_compresses_on_first_gzip_request(topology):
+    """Test the first gzip request writes the sidecar and later ones reuse it."""
+    response = _get(topology, **{"Accept-Encoding": "gzip, deflate"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.get_data()) == GEXF
+    assert response.get_etag()[0].endswith("-gz")
+
+    sidecar_mtime = _gzip_sidecar(topology).stat().st_mtime_ns
+    _get(topology, **{"Accept-Encoding": "gzip"})
+    assert _gzip_sidecar(topology).stat().st_mtime_ns == sidecar_mtime
+
+
+def test_send_topology_recompresses_stale_sidecar(topology):
+    """Test a sidecar older than its file is rewritten before it is served."""
+    _gzip_sidecar(topology).write_bytes(gzip.compress(b"old topology"))
+    stat = topology.stat()
+    os.utime(_gzip_sidecar(topology), ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**9))
+
+    response = _get(topology, **{"Accept-Encoding": "gzip"})
+    assert gzip.decompress(response.get_data()) == GEXF
+
+
+def test_send_topology_not_modified(topology):
+    """Test a matching If-None-Match gets a 304, per encoding."""
+    etag = _get(topology).get_etag()[0]
+    response = _get(topology, **{"If-None-Match": f'"{etag}"'})
+    assert response.status_code == 304
+
+    # The plain ETag doesn't match the compressed representation
+    response = _get(topology, **{"If-None-Match": f'"{etag}"', "Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+
+
+def test_index_refresh_prunes_sidecars(tmp_path, monkeypatch):
+    """Test sidecars are deleted with their GEXF or once it is rewritten."""
+    monkeypatch.setattr(api_server, "OUTPUT_DIR", tmp_path)
+    current = tmp_path / "topology_1.gexf"
+    rewritten = tmp_path / "topology_2.gexf"
+    deleted = tmp_path / "topology_3.gexf"
+    for path in (current, rewritten, deleted):
+        path.write_bytes(GEXF)
+        _write_gzip_sidecar(path)
+    deleted.unlink()
+    stat = rewritten.stat()
+    os.utime(rewritten, ns=(stat.st_atime_ns, _gzip_sidecar(rewritten).stat().st_mtime_ns + 10**9))
+
+    _refresh_topology_index()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "topology_1.gexf", "topology_1.gexf.gz", "topology_2.gexf",
+    ]
+    assert [path.name for path, _ in api_server._TOPO_INDEX["files"]] == ["topology_2.gexf", "topology_1.gexf"]
+
+
+def test_replace_with_link_ignores_other_writers_temp_files(tmp_path):
+    """Test relinking leaves a temp file another writer is using for dst alone."""
+    backup = tmp_path / "topology_1.gexf"
+    backup.write_bytes(GEXF)
+    latest = tmp_path / "topology_latest.gexf"
+    latest.write_bytes(b"old")
+    other_tmp = tmp_path / ".topology_latest.gexf.tmp"  # e.g. the node mid-write
+    other_tmp.write_bytes(b"partial")
+
+    _replace_with_link(backup, latest)
+
+    assert latest.samefile(backup)
+    assert other_tmp.read_bytes() == b"partial"
+    assert backup.read_bytes() == GEXF
+    assert sorted(p.name for p in tmp_path.iterdir()) == [".topology_latest.gexf.tmp", "topology_1.gexf", "topology_latest.gexf"]
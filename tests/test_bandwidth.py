@@ -0,0 +1,72 @@
+"""
+Intermap - Distributed P2P Internet Topology Mapper
+Copyright (c) 2025 Jay Wenden
+Licensed under CC-BY-NC-SA 4.0
+"""
+"""
+Unit tests for bandwidth test bookkeeping
+"""
+import ipaddress
+import time
+import pytest
+from src.bandwidth.bandwidth_tester import BandwidthResult, IPerf3Client, _PeakTable, _network_key
+
+
+def _result(target, download, upload=0.0, latency_ms=None):
+    return BandwidthResult(target=target, download_mbps=download, upload_mbps=upload, latency_ms=latency_ms)
+
+
+def test_peak_table_keeps_best_result():
+    """Test only a result with more total bandwidth replaces a target's peak."""
+    table = _PeakTable()
+    first = _result("203.0.113.1", 100.0, 10.0, latency_ms=5.0)
+    worse = _result("203.0.113.1", 50.0, 10.0)
+    better = _result("203.0.113.1", 120.0, 0.0)
+
+    assert table.update("203.0.113.1", first) == (True, None)
+    assert table.update("203.0.113.1", worse) == (False, 100.0)
+    assert table.get("203.0.113.1") is first and first.peak and not worse.peak
+
+    assert table.update("203.0.113.1", better) == (True, 100.0)
+    assert table.get("203.0.113.1") is better and better.peak
+    assert not first.peak  # Replaced peaks are no longer flagged
+    assert table.get("203.0.113.2") is None
+
+
+def test_peak_table_keeps_order():
+    """Test peaks are kept in first-tested order, keyed by IPv4 address or hostname."""
+    table = _PeakTable()
+    targets = ["203.0.113.1", "iperf.example.net", "2001:db8::1", "203.0.113.2"]
+    for i, target in enumerate(targets):
+        table.update(target, _result(target, float(i)))
+    table.update("203.0.113.1", _result("203.0.113.1", 10.0))
+
+    assert len(table) == 4
+    assert [(r.target, r.download_mbps) for r in table.all()] == [("203.0.113.1", 10.0)] + [(t, float(i)) for i, t in enumerate(targets)][1:]
+
+
+def test_split_by_probe_cache():
+    """Test hosts are split by fresh cached probe results, per port."""
+    IPerf3Client.clear_probe_cache()
+    now = time.monotonic()
+    IPerf3Client._probe_cache.update({
+        ("203.0.113.1", 5201): (True, now + 60),
+        ("203.0.113.2", 5201): (False, now + 60),
+        ("203.0.113.3", 5201): (True, now - 1),  # Expired
+        ("203.0.113.4", 5202): (True, now + 60),  # Other port
+    })
+    try:
+        hosts = ["203.0.113.1", "203.0.113.2", "203.0.113.3", "203.0.113.4"]
+        assert IPerf3Client.split_by_probe_cache(hosts) == (
+            ["203.0.113.1"], ["203.0.113.2"], ["203.0.113.3", "203.0.113.4"],
+        )
+    finally:
+        IPerf3Client.clear_probe_cache()
+
+
+def test_network_key():
+    """Test targets are grouped by /16 (IPv4) or /48 (IPv6) network."""
+    assert _network_key("203.0.113.1") == ipaddress.ip_network("203.0.0.0/16")
+    assert _network_key("203.0.200.9") == _network_key("203.0.113.1")
+    assert _network_key("2001:db8:1:2::1") == ipaddress.ip_network("2001:db8:1::/48")
+    assert _network_key("iperf.example.net") is None
@@ -8,8 +8,10 @@ Unit tests for GEXF graph generation
 """
 import pytest
 import tempfile
+import math
 import os
-from src.graph.gexf_generator import NetworkGraph, GEXFGenerator
+from src.graph import gexf_generator
+from src.graph.gexf_generator import NetworkGraph, GEXFGenerator, EdgeData, _known
 
 
 def test_network_graph_add_node():
@@ -59,4 +61,160 @@ def test_gexf_generation():
             os.remove(temp_path)
 
 
-# TODO: Add tests for merge_traceroute functionality
+def test_gexf_generation_streamed_rows():
+    """Test the streamed GEXF rows parse back to the graph's nodes and edges."""
+    import xml.etree.ElementTree as ET
+    
+    graph = NetworkGraph()
+    graph.add_node("192.168.1.1", hostname="router")
+    graph.add_edge("192.168.1.1", "8.8.8.8", rtt_ms=12.5, bandwidth_down_mbps=250.0)
+    
+    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.gexf') as f:
+        temp_path = f.name
+    
+    try:
+        GEXFGenerator(graph).generate(temp_path)
+        
+        ns = {'gexf': 'http://gexf.net/1.3'}
+        root = ET.parse(temp_path).getroot()
+        node_ids = {n.get('id') for n in root.findall('.//gexf:node', ns)}
+        edges = root.findall('.//gexf:edge', ns)
+        
+        assert node_ids == {"192.168.1.1", "8.8.8.8"}
+        assert len(edges) == 1
+        assert edges[0].get('length') == "12.5"
+        assert edges[0].get('color') == GEXFGenerator.BANDWIDTH_COLORS["fast"]
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def test_edge_data_unknown_sentinels():
+    """Test unknown metrics are inf sentinels that any measurement replaces."""
+    edge = EdgeData()
+    assert _known(edge.rtt_ms) is None
+    assert _known(edge.bandwidth_down_mbps) is None
+    assert _known(0.0) == 0.0
+    
+    graph = NetworkGraph()
+    graph.add_edge("10.0.0.1", "10.0.0.2", rtt_ms=5.0, bandwidth_down_mbps=100.0)
+    graph.add_edge("10.0.0.2", "10.0.0.1", rtt_ms=9.0, bandwidth_down_mbps=50.0, bandwidth_up_mbps=20.0)
+    
+    edge = graph.edges[("10.0.0.1", "10.0.0.2")]
+    assert edge.rtt_ms == 5.0  # Lowest RTT kept
+    assert edge.bandwidth_down_mbps == 100.0  # Peak bandwidth kept
+    assert edge.bandwidth_up_mbps == 20.0
+
+
+def test_remove_node_updates_adjacency():
+    """Test removing a node drops its edges and its neighbors' adjacency entries."""
+    graph = NetworkGraph()
+    graph.add_edge("10.0.0.1", "10.0.0.2")
+    graph.add_edge("10.0.0.2", "10.0.0.3")
+    graph.add_edge("10.0.0.2", "10.0.0.2")  # Self-loop from a repeated hop
+    assert graph.adj["10.0.0.2"] == {"10.0.0.1", "10.0.0.2", "10.0.0.3"}
+    
+    graph.remove_node("10.0.0.2")
+    
+    assert "10.0.0.2" not in graph.nodes
+    assert graph.edges == {}
+    assert "10.0.0.2" not in graph.adj
+    assert graph.adj["10.0.0.1"] == set()
+    assert graph.adj["10.0.0.3"] == set()
+    
+    graph.remove_node("10.0.0.2")  # Unknown nodes are ignored
+
+
+def _trace(*hops):
+    return {"hops": [{"hop": i + 1, "ip": ip, "rtt": rtt} for i, (ip, rtt) in enumerate(hops)]}
+
+
+def test_merge_traceroute_segment_rtts():
+    """Test merged edges are weighted by the RTT between consecutive hops."""
+    graph = NetworkGraph()
+    graph.merge_traceroute(_trace(("10.0.0.1", 1.0), ("10.0.0.2", 4.0), ("10.0.0.3", None)))
+    
+    assert graph.edges[("10.0.0.1", "10.0.0.2")].rtt_ms == 3.0
+    assert math.isinf(graph.edges[("10.0.0.2", "10.0.0.3")].rtt_ms)  # Unknown
+    assert graph.nodes["10.0.0.2"]["hop_number"] == 2
+
+
+def test_merge_traceroute_skips_seen_traces():
+    """Test an identical trace is merged once, and again after a node is removed."""
+    graph = NetworkGraph()
+    trace = _trace(("10.0.0.1", 1.0), ("10.0.0.2", 4.0))
+    graph.merge_traceroute(trace)
+    assert len(graph._seen_traces) == 1
+    
+    # A repeat is skipped outright, even if the graph changed meanwhile
+    graph.edges[("10.0.0.1", "10.0.0.2")].rtt_ms = 7.0
+    graph.merge_traceroute(trace)
+    assert graph.edges[("10.0.0.1", "10.0.0.2")].rtt_ms == 7.0
+    
+    graph.remove_node("10.0.0.2")
+    assert not graph._seen_traces
+    graph.merge_traceroute(trace)
+    assert graph.edges[("10.0.0.1", "10.0.0.2")].rtt_ms == 3.0
+
+
+def test_seen_traces_bounded(monkeypatch):
+    """Test only the SEEN_TRACES_SIZE most recently seen traces are remembered."""
+    monkeypatch.setattr(gexf_generator, "SEEN_TRACES_SIZE", 2)
+    graph = NetworkGraph()
+    first, second, third = (_trace(("10.0.0.1", 1.0), (f"10.0.1.{i}", 4.0)) for i in range(3))
+    graph.merge_traceroute(first)
+    graph.merge_traceroute(second)
+    graph.merge_traceroute(first)  # Now the most recent
+    graph.merge_traceroute(third)
+    
+    graph.edges[("10.0.0.1", "10.0.1.0")].rtt_ms = 7.0
+    graph.edges[("10.0.0.1", "10.0.1.1")].rtt_ms = 7.0
+    graph.merge_traceroute(first)  # Remembered, skipped
+    graph.merge_traceroute(second)  # Forgotten, merged again
+    assert graph.edges[("10.0.0.1", "10.0.1.0")].rtt_ms == 7.0
+    assert graph.edges[("10.0.0.1", "10.0.1.1")].rtt_ms == 3.0
+
+
+def test_merge_traceroute_keeps_better_rtt():
+    """Test re-merged hop pairs only ever lower an edge's RTT."""
+    graph = NetworkGraph()
+    graph.merge_traceroute(_trace(("10.0.0.1", 1.0), ("10.0.0.2", 4.0)))
+    graph.merge_traceroute(_trace(("10.0.0.1", 1.0), ("10.0.0.2", 9.0)))  # Slower
+    assert graph.edges[("10.0.0.1", "10.0.0.2")].rtt_ms == 3.0
+    
+    graph.merge_traceroute(_trace(("10.0.0.1", 1.0), ("10.0.0.2", None)))  # Unknown
+    assert graph.edges[("10.0.0.1", "10.0.0.2")].rtt_ms == 3.0
+    
+    graph.merge_traceroute(_trace(("10.0.0.1", 1.0), ("10.0.0.2", 2.0)))  # Faster
+    assert graph.edges[("10.0.0.1", "10.0.0.2")].rtt_ms == 1.0
+
+
+def test_categorize_bandwidths_matches_single():
+    """Test batch bandwidth categorization agrees with the scalar version."""
+    bandwidths = [None, 0.0, 0.5, 1, 9.99, 10, 100, 999, 1000, 2500, 5000, 10000, 25000, 40000, 100000, 250000]
+    generator = GEXFGenerator(NetworkGraph())
+    
+    expected = [GEXFGenerator._categorize_bandwidth(bandwidth)[0] for bandwidth in bandwidths]
+    assert generator._categorize_bandwidths(bandwidths) == expected
+    assert expected[:3] == ["unknown", "very_slow", "very_slow"]
+    assert expected[-1] == "100gig"
+
+
+def test_gexf_generation_replaces_atomically(tmp_path):
+    """Test generate() swaps in a new file instead of rewriting linked copies."""
+    graph = NetworkGraph()
+    graph.add_edge("192.168.1.1", "8.8.8.8", rtt_ms=1.0)
+    
+    output = tmp_path / "topology.gexf"
+    linked = tmp_path / "topology_latest.gexf"
+    GEXFGenerator(graph).generate(str(output))
+    os.link(output, linked)
+    before = linked.read_bytes()
+    
+    graph.add_edge("8.8.8.8", "1.1.1.1", rtt_ms=2.0)
+    GEXFGenerator(graph).generate(str(output))
+    
+    assert linked.read_bytes() == before
+    assert b"1.1.1.1" in output.read_bytes()
+    assert not output.samefile(linked)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["topology.gexf", "topology_latest.gexf"]  # No temp file left
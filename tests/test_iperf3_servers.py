@@ -0,0 +1,160 @@
+"""
+Intermap - Distributed P2P Internet Topology Mapper
+Copyright (c) 2025 Jay Wenden
+Licensed under CC-BY-NC-SA 4.0
+"""
+"""
+Unit tests for the public iperf3 server list fetcher
+"""
+import threading
+import pytest
+from src import iperf3_servers
+from src.iperf3_servers import parse_iperf3_command, fetch_iperf3_servers
+
+README = """# Public iperf3 servers
+
+### Europe
+| Command | Options | Speed | Country | Site |
+|---------|---------|-------|---------|------|
+| iperf3 -c ping.online.net -p 5200-5209 | -R | 10G | FR | Paris |
+| iperf3 -c speedtest.example.de -p 9201 | | 1G | DE | Berlin |
+
+### North America
+| iperf3 -c 203.0.113.5 | | 1G | US |
+""".encode("utf-8")
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, content=b"", etag=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = {"ETag": etag} if etag else {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise iperf3_servers.requests.HTTPError(f"HTTP {self.status_code}")
+
+
+class FakeClient:
+    """Serves README with an ETag, answering If-None-Match with 304."""
+
+    def __init__(self):
+        self.content = README
+        self.etag = '"v1"'
+        self.requests = []
+
+    def get(self, url, timeout=None, headers=None):
+        headers = headers or {}
+        self.requests.append(headers)
+        if headers.get("If-None-Match") == self.etag:
+            return FakeResponse(304)
+        return FakeResponse(200, self.content, self.etag)
+
+
+@pytest.fixture
+def fake_github(monkeypatch, tmp_path):
+    """Point the fetcher at a FakeClient with empty caches and counted DNS lookups."""
+    client = FakeClient()
+    resolved = []
+
+    def resolve(host, timeout=2):
+        resolved.append(host)
+        return "198.51.100.1" if not host[0].isdigit() else host
+
+    monkeypatch.setattr(iperf3_servers, "_CLIENT", client)
+    monkeypatch.setattr(iperf3_servers, "resolve_hostname", resolve)
+    monkeypatch.setattr(iperf3_servers, "SERVER_LIST_CACHE_FILE", tmp_path / "iperf3_servers.json")
+    monkeypatch.setattr(iperf3_servers, "_CACHE", {"servers": None, "ts": 0.0, "etag": None, "digest": None})
+    client.resolved = resolved
+    return client
+
+
+def test_parse_iperf3_command():
+    """Test host and port extraction, with -p on either side of -c."""
+    assert parse_iperf3_command("iperf3 -c ping.online.net -p 5200-5209") == ("ping.online.net", 5200)
+    assert parse_iperf3_command("iperf3 -p 9201 -c speedtest.example.de") == ("speedtest.example.de", 9201)
+    assert parse_iperf3_command("iperf3 -c 8.8.8.8") == ("8.8.8.8", 5201)
+    assert parse_iperf3_command("iperf3 --help") is None
+
+
+def test_readme_rows_parsed(fake_github):
+    """Test server rows are parsed with their continent, country and site."""
+    servers = fetch_iperf3_servers()
+
+    assert [(s["original_host"], s["port"], s["continent"], s["country"], s["location"]) for s in servers] == [
+        ("ping.online.net", 5200, "Europe", "FR", "Paris"),
+        ("speedtest.example.de", 9201, "Europe", "DE", "Berlin"),
+        ("203.0.113.5", 5201, "North America", "US", ""),
+    ]
+    assert servers[0]["host"] == "198.51.100.1"
+
+
+def test_server_list_cached_in_memory(fake_github):
+    """Test a fresh cached list is returned without another request."""
+    first = fetch_iperf3_servers()
+    assert fetch_iperf3_servers() == first
+    assert len(fake_github.requests) == 1
+
+
+def test_stale_list_revalidated_with_etag(fake_github):
+    """Test a stale list is kept on 304 without re-resolving any host."""
+    first = fetch_iperf3_servers()
+    iperf3_servers._CACHE["ts"] = 0.0
+    lookups = len(fake_github.resolved)
+
+    assert fetch_iperf3_servers() == first
+    assert fake_github.requests[-1] == {"If-None-Match": '"v1"'}
+    assert len(fake_github.resolved) == lookups
+
+
+def test_unchanged_content_skips_parse(fake_github):
+    """Test a forced download with identical content reuses the cached list."""
+    first = fetch_iperf3_servers()
+    fake_github.etag = '"v2"'  # New ETag, same bytes
+    lookups = len(fake_github.resolved)
+
+    assert fetch_iperf3_servers(force_refresh=True) == first
+    assert len(fake_github.resolved) == lookups
+    assert iperf3_servers._CACHE["etag"] == '"v2"'
+
+
+def test_changed_content_replaces_list(fake_github):
+    """Test new README content is parsed and saved for other processes."""
+    fetch_iperf3_servers()
+    fake_github.content = README.replace(b"Paris", b"Lyon")
+    fake_github.etag = '"v2"'
+
+    servers = fetch_iperf3_servers(force_refresh=True)
+    assert servers[0]["location"] == "Lyon"
+
+    # A new process starts from the file cache
+    iperf3_servers._CACHE.update(servers=None, ts=0.0, etag=None, digest=None)
+    assert fetch_iperf3_servers() == servers
+    assert len(fake_github.requests) == 2
+
+
+def test_failed_fetch_not_cached(fake_github):
+    """Test a failed download returns nothing and is retried next call."""
+    fake_github.get = lambda url, timeout=None, headers=None: FakeResponse(500)
+    assert fetch_iperf3_servers() == []
+    assert iperf3_servers._CACHE["servers"] is None
+
+
+def test_refresh_does_not_block_cached_reads(fake_github):
+    """Test a slow forced refresh doesn't hold up callers served from the cache."""
+    first = fetch_iperf3_servers()
+    release = threading.Event()
+    get = fake_github.get
+
+    def slow_get(url, timeout=None, headers=None):
+        release.wait(5)
+        return get(url, timeout, headers)
+
+    fake_github.get = slow_get
+    refresh = threading.Thread(target=fetch_iperf3_servers, kwargs={"force_refresh": True})
+    refresh.start()
+    try:
+        assert fetch_iperf3_servers() == first
+    finally:
+        release.set()
+        refresh.join()
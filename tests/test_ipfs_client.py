@@ -0,0 +1,233 @@
+"""
+Intermap - Distributed P2P Internet Topology Mapper
+Copyright (c) 2025 Jay Wenden
+Licensed under CC-BY-NC-SA 4.0
+"""
+"""
+Unit tests for the IPFS client, against an in-process fake of the daemon's RPC API
+"""
+import asyncio
+import json
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+from aiohttp import test_utils
+
+from src.ipfs.client import IPFSClient
+
+SELF_PEER_ID = "12D3KooWSelf"
+OTHER_PEER_ID = "12D3KooWOther"  # A provider that isn't an Intermap node
+
+
+class FakeDaemon:
+    """Minimal IPFS RPC API: add/cat, IPNS, provide and a streamed findprovs."""
+
+    def __init__(self):
+        self.blocks = {}
+        self.ipns = {}
+        self.calls = []
+        self.providers = [SELF_PEER_ID, OTHER_PEER_ID]
+        self.split_records = True
+        self.publish_delay = 0.0
+
+    async def handle(self, request):
+        endpoint = request.match_info["endpoint"]
+        self.calls.append((endpoint, dict(request.query)))
+
+        if endpoint == "version":
+            return web.json_response({"Version": "0.31.0"})
+        if endpoint in ("swarm/peers", "bootstrap/list"):
+            return web.json_response({"Peers": []})
+        if endpoint == "add":
+            reader = await request.multipart()
+            data = await (await reader.next()).read()
+            cid = f"Qm{len(self.blocks)}"
+            self.blocks[cid] = bytes(data)
+            return web.json_response({"Hash": cid})
+        if endpoint == "cat":
+            return web.Response(body=self.blocks[request.query["arg"]])
+        if endpoint == "name/publish":
+            await asyncio.sleep(self.publish_delay)
+            self.ipns[SELF_PEER_ID] = request.query["arg"]
+            return web.json_response({"Name": SELF_PEER_ID, "Value": request.query["arg"]})
+        if endpoint == "name/resolve":
+            path = self.ipns.get(request.query["arg"].split("/")[-1])
+            if path is None:
+                return web.json_response({"Message": "could not resolve name"}, status=500)
+            return web.json_response({"Path": path})
+        if endpoint in ("routing/provide", "pubsub/pub"):
+            return web.Response(text="")
+        if endpoint == "routing/findprovs":
+            # Stream NDJSON with records split across writes
+            response = web.StreamResponse()
+            await response.prepare(request)
+            lines = [
+                b'{"Type":4,"Responses":[{"ID":"%s","Addrs":["/ip4/127.0.0.1/tcp/4001"]}]}\n' % peer_id.encode()
+                for peer_id in self.providers
+            ]
+            if not self.split_records:
+                await response.write(b"".join(lines))
+            for line in lines if self.split_records else []:
+                await response.write(line[:15])
+                await asyncio.sleep(0.01)
+                await response.write(line[15:])
+            await response.write(b'{"Type":0}\n')
+            await response.write_eof()
+            return response
+        return web.json_response({"Message": f"unknown endpoint {endpoint}"}, status=404)
+
+
+def _run_with_daemon(scenario):
+    """Run scenario(client, daemon) against a fake daemon on a free port."""
+    async def _main():
+        daemon = FakeDaemon()
+        app = web.Application()
+        app.router.add_post("/api/v0/{endpoint:.*}", daemon.handle)
+        server = test_utils.TestServer(app, host="127.0.0.1")
+        await server.start_server()
+        client = IPFSClient(f"/ip4/127.0.0.1/tcp/{server.port}")
+        try:
+            await client.connect()
+            return await scenario(client, daemon)
+        finally:
+            await client.disconnect()
+            await server.close()
+
+    return asyncio.run(_main())
+
+
+def test_announce_then_discover():
+    """Test a node's announcement is found through findprovs + IPNS + cat."""
+    async def scenario(client, daemon):
+        cid = await client.announce_node("node-a", "203.0.113.7")
+        await client._publish_task
+        assert daemon.ipns[SELF_PEER_ID] == f"/ipfs/{cid}"
+
+        peers = await client.discover_peers()
+        assert [peer["node_id"] for peer in peers] == ["node-a"]
+        assert set(client._known_nodes) == {SELF_PEER_ID}
+
+        # Known providers are reused without another resolve
+        resolves = sum(1 for endpoint, _ in daemon.calls if endpoint == "name/resolve")
+        peers = await client.discover_peers()
+        assert [peer["node_id"] for peer in peers] == ["node-a"]
+        assert sum(1 for endpoint, _ in daemon.calls if endpoint == "name/resolve") == resolves + 1  # only OTHER_PEER_ID
+
+    _run_with_daemon(scenario)
+
+
+def test_announce_publishes_ipns_with_announce_ttl():
+    """Test the IPNS record TTL follows the announce interval."""
+    async def scenario(client, daemon):
+        await client.announce_node("node-a", "203.0.113.7")
+        await client._publish_task
+        params = next(query for endpoint, query in daemon.calls if endpoint == "name/publish")
+        assert params["ttl"] == f"{IPFSClient.ANNOUNCE_INTERVAL}s"
+        assert params["key"] == "self"
+
+    _run_with_daemon(scenario)
+
+
+def test_announce_does_not_wait_for_ipns_publish():
+    """Test a slow IPNS publish runs in the background and is superseded by the next announce."""
+    async def scenario(client, daemon):
+        daemon.publish_delay = 5.0
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await client.announce_node("node-a", "203.0.113.7")
+        first = client._publish_task
+        assert loop.time() - start < 1.0
+        await asyncio.sleep(0.1)  # Let the publish reach the daemon
+        assert SELF_PEER_ID not in daemon.ipns
+
+        daemon.publish_delay = 0.0
+        cid = await client.announce_node("node-a", "203.0.113.7")
+        await client._publish_task
+        assert first.cancelled()
+        assert daemon.ipns[SELF_PEER_ID] == f"/ipfs/{cid}"
+
+    _run_with_daemon(scenario)
+
+
+def test_discover_ignores_non_intermap_providers():
+    """Test providers without resolvable Intermap node info are dropped."""
+    async def scenario(client, daemon):
+        daemon.providers = [OTHER_PEER_ID]
+        assert await client.discover_peers() == []
+        assert client._known_nodes == {}
+
+    _run_with_daemon(scenario)
+
+
+def test_discover_verifies_nearest_providers_first():
+    """Test providers are verified in RTT order, with cached RTTs costing no probe."""
+    async def scenario(client, daemon):
+        client.DISCOVERY_CONCURRENCY = 1
+        daemon.providers = ["12D3KooWFar", "12D3KooWNone", "12D3KooWNear"]
+        daemon.split_records = False
+        client._provider_rtts = {
+            "12D3KooWFar": (0.2, float("inf")),
+            "12D3KooWNear": (0.01, float("inf")),
+        }
+
+        assert await client.discover_peers() == []
+        resolved = [query["arg"] for endpoint, query in daemon.calls if endpoint == "name/resolve"]
+        assert resolved == ["/ipns/12D3KooWNear", "/ipns/12D3KooWFar", "/ipns/12D3KooWNone"]
+
+    _run_with_daemon(scenario)
+
+
+def test_node_info_published_as_plain_json():
+    """Test node info stays plain JSON that any Intermap node can parse."""
+    async def scenario(client, daemon):
+        cid = await client.announce_node("node-a", "203.0.113.7")
+        info = json.loads(daemon.blocks[cid])
+        assert info["node_id"] == "node-a"
+        assert info["protocol_version"] == "intermap-v1"
+
+    _run_with_daemon(scenario)
+
+
+def _cats(daemon):
+    return sum(1 for endpoint, _ in daemon.calls if endpoint == "cat")
+
+
+def test_fetch_peer_info_coalesces_and_caches():
+    """Test concurrent fetches of a CID share one cat, and later ones hit the cache."""
+    async def scenario(client, daemon):
+        cid = await client.add_json({"node_id": "node-a"})
+        infos = await asyncio.gather(*(client.fetch_peer_info(cid) for _ in range(5)))
+        assert infos == [{"node_id": "node-a"}] * 5
+        assert _cats(daemon) == 1
+        assert client._peer_fetches == {}
+
+        assert await client.fetch_peer_info(cid) == {"node_id": "node-a"}
+        assert _cats(daemon) == 1
+
+        # Expired entries are fetched again
+        cached_at, info = client._peer_cache[cid]
+        client._peer_cache[cid] = (cached_at - client.PEER_CACHE_TTL, info)
+        assert await client.fetch_peer_info(cid) == {"node_id": "node-a"}
+        assert _cats(daemon) == 2
+
+    _run_with_daemon(scenario)
+
+
+def test_fetch_peer_info_evicts_least_recently_used():
+    """Test the peer cache is bounded, evicting the least recently used CID."""
+    async def scenario(client, daemon):
+        client.PEER_CACHE_SIZE = 2
+        cids = [await client.add_json({"node_id": f"node-{i}"}) for i in range(3)]
+
+        await client.fetch_peer_info(cids[0])
+        await client.fetch_peer_info(cids[1])
+        await client.fetch_peer_info(cids[0])  # cids[1] is now least recently used
+        await client.fetch_peer_info(cids[2])
+        assert list(client._peer_cache) == [cids[0], cids[2]]
+
+        # Failures aren't cached
+        assert await client.fetch_peer_info("QmMissing") is None
+        assert "QmMissing" not in client._peer_cache
+
+    _run_with_daemon(scenario)
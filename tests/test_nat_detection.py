@@ -0,0 +1,231 @@
+"""
+Intermap - Distributed P2P Internet Topology Mapper
+Copyright (c) 2025 Jay Wenden
+Licensed under CC-BY-NC-SA 4.0
+"""
+"""
+Unit tests for NAT detection, port checks and their caches
+"""
+import asyncio
+import socket
+import subprocess
+import time
+import pytest
+from src import nat_detection
+from src.nat_detection import (
+    detect_nat, detect_nat_async, get_external_ip, get_external_ip_async, check_port_open,
+    check_port_open_async, check_traceroute_capability, invalidate_nat_cache,
+)
+
+LOCAL_IP = "192.168.1.20"
+EXTERNAL_IP = "203.0.113.7"
+
+
+@pytest.fixture(autouse=True)
+def empty_caches(monkeypatch):
+    """Give each test its own empty NAT, port and local IP caches."""
+    monkeypatch.setattr(nat_detection, "_nat_cache", {})
+    monkeypatch.setattr(nat_detection, "_port_cache", {})
+    monkeypatch.setattr(nat_detection, "_local_ip_cache", LOCAL_IP)
+
+
+@pytest.fixture
+def ip_lookups(monkeypatch):
+    """Answer external IP lookups with EXTERNAL_IP, counting them."""
+    lookups = []
+
+    def lookup(timeout=5):
+        lookups.append(timeout)
+        return EXTERNAL_IP
+
+    async def lookup_async(timeout=5):
+        return lookup(timeout)
+
+    monkeypatch.setattr(nat_detection, "get_external_ip", lookup)
+    monkeypatch.setattr(nat_detection, "get_external_ip_async", lookup_async)
+    return lookups
+
+
+@pytest.fixture
+def listener():
+    """A local TCP port that accepts connections."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(8)
+    yield sock.getsockname()[1]
+    sock.close()
+
+
+def test_external_ip_first_good_answer_wins(monkeypatch):
+    """Test the fastest good answer is returned without waiting for slower services."""
+    answers = {"https://slow": ("198.51.100.9", 2.0), "https://fast": (EXTERNAL_IP, 0.05), "https://empty": (None, 0.0)}
+
+    def query(service, timeout):
+        if service not in answers:
+            raise ConnectionError("service down")
+        ip, delay = answers[service]
+        time.sleep(delay)
+        return ip
+
+    monkeypatch.setattr(nat_detection, "EXTERNAL_IP_SERVICES", tuple(answers) + ("https://broken",))
+    monkeypatch.setattr(nat_detection, "_query_ip_service", query)
+
+    start = time.monotonic()
+    assert get_external_ip() == EXTERNAL_IP
+    assert time.monotonic() - start < 1.0
+
+
+def test_external_ip_none_when_all_services_fail(monkeypatch):
+    """Test None is returned once every service has failed."""
+    monkeypatch.setattr(nat_detection, "_query_ip_service", lambda service, timeout: None)
+    assert get_external_ip() is None
+
+
+def test_external_ip_async_first_good_answer_wins(monkeypatch):
+    """Test the async lookup races services served by a local HTTP server."""
+    pytest.importorskip("aiohttp")
+    from aiohttp import web
+    from aiohttp import test_utils
+
+    async def slow(request):
+        await asyncio.sleep(2)
+        return web.Response(text="198.51.100.9\n")
+
+    async def fast(request):
+        await asyncio.sleep(0.05)
+        return web.Response(text=f"{EXTERNAL_IP}\n")
+
+    async def error(request):
+        return web.Response(status=500)
+
+    async def _main():
+        app = web.Application()
+        app.router.add_get("/slow", slow)
+        app.router.add_get("/fast", fast)
+        app.router.add_get("/error", error)
+        server = test_utils.TestServer(app, host="127.0.0.1")
+        await server.start_server()
+        base = f"http://127.0.0.1:{server.port}"
+        monkeypatch.setattr(nat_detection, "EXTERNAL_IP_SERVICES", (f"{base}/error", f"{base}/slow", f"{base}/fast"))
+        try:
+            start = time.monotonic()
+            ip = await get_external_ip_async()
+            return ip, time.monotonic() - start
+        finally:
+            await server.close()
+
+    ip, elapsed = asyncio.run(_main())
+    assert ip == EXTERNAL_IP
+    assert elapsed < 1.0
+
+
+def test_detect_nat_cached_within_ttl(ip_lookups):
+    """Test a fresh result is reused, and ttl=0 or an expired entry probes again."""
+    assert detect_nat() == (True, LOCAL_IP, EXTERNAL_IP)
+    assert detect_nat() == (True, LOCAL_IP, EXTERNAL_IP)
+    assert len(ip_lookups) == 1
+
+    detect_nat(ttl=0)
+    assert len(ip_lookups) == 2
+
+    nat_detection._nat_cache[LOCAL_IP] = (time.time() - nat_detection.NAT_CACHE_TTL - 1, (True, LOCAL_IP, "198.51.100.9"))
+    assert detect_nat() == (True, LOCAL_IP, EXTERNAL_IP)
+    assert len(ip_lookups) == 3
+
+
+def test_detect_nat_failure_not_cached(monkeypatch):
+    """Test a failed external IP lookup is retried on the next call."""
+    lookups = []
+    monkeypatch.setattr(nat_detection, "get_external_ip", lambda timeout=5: lookups.append(timeout))
+
+    assert detect_nat() == (False, LOCAL_IP, None)
+    assert detect_nat() == (False, LOCAL_IP, None)
+    assert len(lookups) == 2
+
+
+def test_detect_nat_async_shares_cache(ip_lookups):
+    """Test the sync and async detection share one cache."""
+    assert asyncio.run(detect_nat_async()) == (True, LOCAL_IP, EXTERNAL_IP)
+    assert detect_nat() == (True, LOCAL_IP, EXTERNAL_IP)
+    assert len(ip_lookups) == 1
+
+
+def test_invalidate_nat_cache(ip_lookups, listener):
+    """Test invalidation forgets the local IP, NAT and port results."""
+    detect_nat()
+    check_port_open("127.0.0.1", listener)
+
+    invalidate_nat_cache()
+
+    assert nat_detection._local_ip_cache is None
+    assert nat_detection._nat_cache == {}
+    assert nat_detection._port_cache == {}
+
+
+def test_port_check_cached(listener):
+    """Test a port result is reused within its TTL, and ttl=0 neither reads nor writes it."""
+    assert check_port_open("127.0.0.1", listener, ttl=0)
+    assert nat_detection._port_cache == {}
+
+    assert check_port_open("127.0.0.1", listener)
+    nat_detection._port_cache[("127.0.0.1", listener)] = (time.time(), False)
+    assert not check_port_open("127.0.0.1", listener)
+    assert asyncio.run(check_port_open_async("127.0.0.1", listener)) is False
+    assert check_port_open("127.0.0.1", listener, ttl=0)
+    assert asyncio.run(check_port_open_async("127.0.0.1", listener, ttl=0)) is True
+
+
+def test_port_cache_bounded(monkeypatch, listener):
+    """Test the port cache drops its oldest entries once full."""
+    monkeypatch.setattr(nat_detection, "PORT_CACHE_SIZE", 2)
+    for host in ("127.0.0.1", "127.0.0.2", "127.0.0.3"):
+        asyncio.run(check_port_open_async(host, listener, timeout=1))
+
+    assert list(nat_detection._port_cache) == [("127.0.0.2", listener), ("127.0.0.3", listener)]
+
+
+def test_traceroute_capability_checked_once(monkeypatch):
+    """Test the traceroute probe runs once per process until cache_clear()."""
+    runs = []
+    monkeypatch.setattr(subprocess, "run", lambda cmd, **kwargs: runs.append(cmd) or subprocess.CompletedProcess(cmd, 0))
+    check_traceroute_capability.cache_clear()
+    try:
+        assert check_traceroute_capability()
+        assert check_traceroute_capability()
+        assert len(runs) == 1
+    finally:
+        check_traceroute_capability.cache_clear()
+
+
+def test_connectivity_async(monkeypatch):
+    """Test the checks run concurrently and their results are collected."""
+    async def open_connection(host, port):
+        await asyncio.sleep(0.2)
+        raise OSError("unreachable")
+
+    async def nat(ttl=nat_detection.NAT_CACHE_TTL, force=False):
+        await asyncio.sleep(0.2)
+        return True, LOCAL_IP, EXTERNAL_IP
+
+    async def port_open(host, port, timeout=5, ttl=nat_detection.PORT_CHECK_TTL):
+        assert (host, port) == (EXTERNAL_IP, 5201)
+        return False
+
+    def traceroute():
+        time.sleep(0.2)
+        return True
+
+    monkeypatch.setattr(nat_detection.asyncio, "open_connection", open_connection)
+    monkeypatch.setattr(nat_detection, "detect_nat_async", nat)
+    monkeypatch.setattr(nat_detection, "check_port_open_async", port_open)
+    monkeypatch.setattr(nat_detection, "check_traceroute_capability", traceroute)
+
+    start = time.monotonic()
+    results = asyncio.run(nat_detection.test_connectivity_async())
+    assert time.monotonic() - start < 0.5
+
+    assert {key: results[key] for key in ("internet", "nat", "local_ip", "external_ip", "traceroute", "iperf3_port")} == {
+        "internet": False, "nat": True, "local_ip": LOCAL_IP, "external_ip": EXTERNAL_IP,
+        "traceroute": True, "iperf3_port": False,
+    }
+    assert len(results["suggestions"]) == 3